@@ -1,13 +1,71 @@
 import time
 import traceback
+import uuid
 import streamlit as st
 from auth import authenticate, register
 from storage import save_query, get_query_history
-from data.file_handler import load_file_data, suggest_questions  # You create this
-from db.db_connector import DatabaseConnector  # Updated import
-from chatbot.agent import create_agent_for_dataframe_sheets, rephrase_prompts  # You create this
+from chatbot.warmup import start_background_warmup, health_status, get_latency_report
+from chatbot.llm_gateway import OLLAMA_BASE_URL
+from utils.metrics import span, span_summary, start_metrics_server
 import logging
+
+
+@st.cache_resource
+def start_llm_warmup():
+    # Runs once per server process: preload models while the user logs in
+    return start_background_warmup()
+
+
+@st.cache_resource
+def start_metrics_endpoint():
+    # Prometheus /metrics on METRICS_PORT (disabled when unset)
+    return start_metrics_server()
+
+
+def show_preview(df, key: str, widget_key: str):
+    # Page, sort, filter or sample server-side; only one bounded page is sent to the browser
+    from data.preview import (PREVIEW_MAX_COLUMNS, page_frame, page_rows, stratified_sample,
+                              stratify_column, view_positions)
+
+    rows = page_rows(df.shape[1])
+    columns = list(df.columns)
+    mode_col, sort_col, order_col, filter_col, text_col = st.columns([1, 1.5, 1, 1.5, 1.5])
+    mode = mode_col.selectbox("View", ["Pages", "Sample"], key=f"{widget_key}_mode")
+    if mode == "Sample":
+        by = stratify_column(df)
+        sample = stratified_sample(df, rows, key, by)
+        st.dataframe(sample)
+        st.caption(f"Sample of {len(sample):,} of {len(df):,} rows"
+                   + (f", stratified by {by}" if by is not None else ""))
+        return
+
+    no_column = lambda c: "—" if c is None else str(c)
+    sort_by = sort_col.selectbox("Sort by", [None] + columns, format_func=no_column, key=f"{widget_key}_sort")
+    descending = order_col.checkbox("Descending", key=f"{widget_key}_desc")
+    filter_column = filter_col.selectbox("Filter column", [None] + columns, format_func=no_column,
+                                         key=f"{widget_key}_filter_col")
+    filter_text = text_col.text_input("Filter", placeholder="text, or e.g. >= 10", key=f"{widget_key}_filter")
+
+    positions = view_positions(df, key, sort_by, not descending, filter_column, filter_text)
+    pages = max(1, -(-len(positions) // rows))
+    page_key = f"{widget_key}_page"
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    page = st.number_input("Page", min_value=1, max_value=pages, step=1, key=page_key)
+    st.dataframe(page_frame(df, positions, page - 1, rows))
+    start = (page - 1) * rows
+    caption = f"Rows {min(start + 1, len(positions)):,}–{min(start + rows, len(positions)):,} of {len(positions):,}"
+    if len(positions) != len(df):
+        caption += f" (filtered from {len(df):,})"
+    if df.shape[1] > PREVIEW_MAX_COLUMNS:
+        caption += f"; first {PREVIEW_MAX_COLUMNS} of {df.shape[1]} columns shown"
+    st.caption(caption + f" · page {page:,} of {pages:,}")
+
+
 try:
+    start_llm_warmup()
+    start_metrics_endpoint()
+
     # Session state for login
     if "logged_in" not in st.session_state:
         st.session_state.logged_in = False
@@ -42,12 +100,40 @@ try:
     # ----------------------------
     # MAIN APP SECTION
     # ----------------------------
+    # Heavy modules (pandas, langchain, DB drivers) are imported only after
+    # login so the login page renders without paying for them.
+    from data.file_handler import load_file_data
+    from db.db_connector import DatabaseConnector
+    from db.join_graph import build_related_dataset
+    from db.upload_db import column_names, export_tables, session_db_path, table_name
+    from chatbot.worker_pool import answer_question
+    from chatbot.precompute import get_precomputer
+    from data.frame_store import get_frame_store, content_key, sheet_key, memory_usage_bytes
+    from data.preview import adaptive_fetch_limit
+    frame_store = get_frame_store()
+    precomputer = get_precomputer()
+
     st.sidebar.title(f"Welcome, {st.session_state.username}")
     if st.sidebar.button("Logout"):
         st.session_state.logged_in = False
         st.session_state.username = None
         st.rerun()
 
+    with st.sidebar.expander("🧠 LLM Status"):
+        health = health_status(OLLAMA_BASE_URL)
+        if health is None:
+            st.write("⚪ Checking Ollama...")
+        elif health["success"]:
+            st.write(f"🟢 Ollama reachable ({health['latency']}s)")
+        else:
+            st.write(f"🔴 Ollama unreachable: {health['error']}")
+        for model, stats in get_latency_report().items():
+            st.write(f"**{model}** first token: cold {stats['cold_avg_s']}s, warm {stats['warm_avg_s']}s")
+
+    with st.sidebar.expander("⏱️ Performance"):
+        for row in span_summary():
+            st.write(f"**{row['span']}**: p50 {row['p50_s']:.3f}s, p95 {row['p95_s']:.3f}s ({row['count']} calls)")
+
     st.title("📊 Data Assistant with LLM")
 
     # ----------------------------
@@ -56,22 +142,51 @@ try:
     source = st.radio("Choose data source:", ["Upload File", "Database"])
 
     dataframes = []
+    profiles = {}
+    # Connector/database the custom query box runs against, if any
+    query_connector = None
+    query_database = None
 
     if source == "Upload File":
         uploaded_files = st.file_uploader("Upload CSV or Excel file(s)", type=["csv", "xlsx"], accept_multiple_files=True)
         if uploaded_files:
             for file in uploaded_files:
-                sheets = load_file_data(file)  # returns dict of sheet_name: dataframe
+                # returns dict of sheet_name: dataframe, compacted and shared across sessions
+                file_key = content_key(file.getvalue(), file.name)
+                sheets = frame_store.get_or_load_sheets(file_key, lambda: load_file_data(file))
+                # queue profile/suggestions/summary for every sheet before rendering the first
+                for name, df in sheets.items():
+                    precomputer.submit(sheet_key(file_key, name), name, df, st.session_state.username,
+                                       f"{file.name}:{name}")
                 for name, df in sheets.items():
+                    fingerprint = sheet_key(file_key, name)
                     st.write(f"### 📄 Sheet: {name}")
-                    st.dataframe(df)
+                    show_preview(df, fingerprint, f"preview_{file.name}_{name}")
                     if st.checkbox(f"🔍 Generate summary for {name}?", key=f"summary_{name}"):
-                        summary = create_agent_for_dataframe_sheets([(name, df, [])], "Give a short summary of this dataset.")
+                        summary = precomputer.result(fingerprint, "summary")
                         st.info(f"🧠 **Analysis of {name}**:\n\n{summary}")
-                    suggested_questions_df = suggest_questions(df)
-                    suggested_questions_df = rephrase_prompts(suggested_questions_df)
+                    profiles[name] = precomputer.result(fingerprint, "profile")
+                    suggested_questions_df = precomputer.result(fingerprint, "suggestions")
                     dataframes.append((name, df,suggested_questions_df))
 
+            # Bulk-load the uploads into a per-session SQLite file so they can be queried with SQL
+            if st.checkbox("🗄️ Query uploaded data with SQL", key="upload_sql"):
+                if "session_id" not in st.session_state:
+                    st.session_state.session_id = uuid.uuid4().hex
+                upload_db = session_db_path(st.session_state.username, st.session_state.session_id)
+                tables = {}
+                for file in uploaded_files:
+                    file_key = content_key(file.getvalue(), file.name)
+                    for name, df in frame_store.get_or_load_sheets(file_key, lambda: load_file_data(file)).items():
+                        table, n = table_name(file.name, name), 2
+                        while table in tables:
+                            table, n = f"{table_name(file.name, name)}_{n}", n + 1
+                        tables[table] = (sheet_key(file_key, name), df)
+                with st.spinner("Loading uploads into SQLite..."):
+                    export_tables(upload_db, tables)
+                st.caption("Tables: " + ", ".join(tables))
+                query_connector = DatabaseConnector("sqlite", upload_db, 0, "", "", "")
+
     elif source == "Database":
         st.subheader("🗄️ Database Configuration")
         
@@ -145,6 +260,7 @@ try:
                                 st.success(f"✅ {result['message']}")
                                 st.session_state.db_connector = connector
                                 st.session_state.db_connected = True
+                                st.session_state.db_frames = {}
                                 st.rerun()
                             else:
                                 st.error(f"❌ Connection failed: {result['error']}")
@@ -164,6 +280,7 @@ try:
             if st.button("🔌 Disconnect", type="secondary"):
                 st.session_state.db_connector = None
                 st.session_state.db_connected = False
+                st.session_state.db_frames = {}
                 st.rerun()
 
             # Get databases
@@ -182,29 +299,75 @@ try:
                                 help="Choose which tables to analyze"
                             )
                             
-                            # Load selected tables
+                            if st.button("🔄 Reload tables", help="Fetch the selected tables again"):
+                                st.session_state.db_frames = {}
+
+                            # Load selected tables; wide tables fetch fewer rows for analysis.
+                            # Fetched frames are kept for this session (only for the current
+                            # selection), so paging, sorting and filtering do not re-fetch
+                            db_source = f"{connector.db_type}:{connector.host}:{connector.port}:{selected_db}"
+                            fetched = st.session_state.get("db_frames", {})
+                            current = {}
                             for table in selected_tables:
                                 with st.spinner(f"Loading {table}..."):
                                     try:
-                                        df = connector.fetch_data(table, selected_db)
+                                        table_key = f"{db_source}:{table}"
+                                        entry = fetched.get(table_key)
+                                        if entry is None:
+                                            limit = adaptive_fetch_limit(len(connector.get_column_names(table, selected_db)))
+                                            df = connector.fetch_data(table, selected_db, limit=limit)
+                                            entry = (limit, None, df) if df.empty else (limit, *frame_store.put(df))
+                                        limit, fingerprint, df = entry
+                                        # Empty results may be a failed fetch, so they are retried on the next rerun
                                         if not df.empty:
+                                            current[table_key] = entry
+                                        if not df.empty:
+                                            precomputer.submit(fingerprint, table, df, st.session_state.username,
+                                                               f"{connector.db_type}:{connector.host}:{selected_db}:{table}")
                                             st.write(f"### 🧮 Table: {table}")
-                                            st.dataframe(df.head(100))  # Show first 100 rows
-                                            st.info(f"📊 Shape: {df.shape[0]} rows × {df.shape[1]} columns")
+                                            show_preview(df, fingerprint, f"preview_db_{table}")
+                                            st.info(f"📊 Shape: {df.shape[0]} rows × {df.shape[1]} columns"
+                                                    + (f" (first {limit:,} rows fetched for analysis)" if len(df) >= limit else ""))
                                             
                                             # Generate summary
                                             if st.checkbox(f"🔍 Generate summary for {table}?", key=f"db_summary_{table}"):
-                                                summary = create_agent_for_dataframe_sheets([(table, df, [])], "Give a short summary of this dataset.")
+                                                summary = precomputer.result(fingerprint, "summary")
                                                 st.info(f"🧠 **Analysis of {table}**:\n\n{summary}")
                                             
                                             # Generate suggested questions
-                                            suggested_questions_df = suggest_questions(df)
-                                            suggested_questions_df = rephrase_prompts(suggested_questions_df)
+                                            profiles[table] = precomputer.result(fingerprint, "profile")
+                                            suggested_questions_df = precomputer.result(fingerprint, "suggestions")
                                             dataframes.append((table, df, suggested_questions_df))
                                         else:
                                             st.warning(f"Table {table} is empty or could not be loaded")
                                     except Exception as e:
                                         st.error(f"Error loading table {table}: {str(e)}")
+
+                            # Join related tables along their foreign keys instead of
+                            # stacking unrelated rows into one NaN-padded frame
+                            if len(selected_tables) > 1 and st.checkbox("🔗 Join selected tables using foreign keys", value=True, key="db_join_tables"):
+                                join_key = f"{db_source}:join:" + ",".join(sorted(selected_tables))
+                                if join_key not in fetched:
+                                    with st.spinner("Joining related tables..."):
+                                        join_columns = sum(frame.shape[1] for _, frame, _ in dataframes)
+                                        joined = build_related_dataset(connector, selected_db, selected_tables,
+                                                                       limit=adaptive_fetch_limit(join_columns))
+                                    fetched[join_key] = None if joined is None else (*frame_store.put(joined[0]), joined[1])
+                                joined = current[join_key] = fetched[join_key]
+                                if joined is None:
+                                    st.warning("No foreign keys connect the selected tables; analysing them separately.")
+                                else:
+                                    joined_key, joined_df, edges = joined
+                                    joined_name = " ⋈ ".join(selected_tables)
+                                    precomputer.submit(joined_key, joined_name, joined_df, st.session_state.username)
+                                    st.write(f"### 🔗 Joined: {joined_name}")
+                                    st.caption("Joined on: " + ", ".join(repr(edge) for edge in edges))
+                                    show_preview(joined_df, joined_key, "preview_db_join")
+                                    st.info(f"📊 Shape: {joined_df.shape[0]} rows × {joined_df.shape[1]} columns")
+                                    profiles = {joined_name: precomputer.result(joined_key, "profile")}
+                                    suggested_questions_df = precomputer.result(joined_key, "suggestions")
+                                    dataframes = [(joined_name, joined_df, suggested_questions_df)]
+                            st.session_state.db_frames = current
                         else:
                             st.warning("No tables found in the selected database")
                 else:
@@ -213,31 +376,55 @@ try:
                 st.error(f"Database error: {str(e)}")
                 st.session_state.db_connected = False
 
-        # Custom Query Section
         if st.session_state.db_connected and st.session_state.db_connector:
-            st.subheader("📝 Custom Query")
-            custom_query = st.text_area(
-                "Enter SQL Query",
-                placeholder="SELECT * FROM your_table WHERE condition = 'value'",
-                help="Write your custom SQL query here"
-            )
-            
-            if st.button("🚀 Execute Query") and custom_query.strip():
-                with st.spinner("Executing query..."):
-                    try:
-                        df = st.session_state.db_connector.fetch_data(custom_query, selected_db if 'selected_db' in locals() else None)
-                        if not df.empty:
-                            st.success("Query executed successfully!")
-                            st.dataframe(df)
-                            st.info(f"📊 Result: {df.shape[0]} rows × {df.shape[1]} columns")
-                            
-                            # Add to dataframes for analysis
-                            suggested_questions_df = suggest_questions(df)
-                            dataframes.append(("Custom Query", df, suggested_questions_df))
-                        else:
-                            st.warning("Query returned no results")
-                    except Exception as e:
-                        st.error(f"Query execution failed: {str(e)}")
+            query_connector = st.session_state.db_connector
+            query_database = selected_db if 'selected_db' in locals() else None
+
+    # Custom Query Section
+    if query_connector is not None:
+        st.subheader("📝 Custom Query")
+        custom_query = st.text_area(
+            "Enter SQL Query",
+            placeholder="SELECT * FROM your_table WHERE condition = 'value'",
+            help="Write your custom SQL query here"
+        )
+        
+        # A stored result only belongs to the connection and database it was run on
+        query_source = f"{query_connector.db_type}:{query_connector.host}:{query_connector.port}:{query_database}"
+        stored = st.session_state.get("custom_query_result")
+        if stored is not None and stored[0] != query_source:
+            st.session_state.custom_query_result = None
+
+        if st.button("🚀 Execute Query") and custom_query.strip():
+            with st.spinner("Executing query..."):
+                try:
+                    df = query_connector.fetch_data(custom_query, query_database)
+                    # Joins often repeat a column name (e.g. two "id"s)
+                    df.columns = column_names(df)
+                    # Kept across reruns so the result can be paged and asked about
+                    st.session_state.custom_query_result = (query_source, *frame_store.put(df)) if not df.empty else None
+                    if df.empty:
+                        st.warning("Query returned no results")
+                    else:
+                        st.success("Query executed successfully!")
+                except Exception as e:
+                    st.error(f"Query execution failed: {str(e)}")
+
+        if st.session_state.get("custom_query_result") is not None:
+            _, query_key, df = st.session_state.custom_query_result
+            try:
+                show_preview(df, query_key, "preview_custom_query")
+                st.info(f"📊 Result: {df.shape[0]} rows × {df.shape[1]} columns")
+
+                # Add to dataframes for analysis
+                precomputer.submit(query_key, "Custom Query", df, st.session_state.username)
+                profiles["Custom Query"] = precomputer.result(query_key, "profile")
+                suggested_questions_df = precomputer.result(query_key, "suggestions")
+                dataframes.append(("Custom Query", df, suggested_questions_df))
+            except Exception as e:
+                # Drop the result so a bad frame does not break every rerun
+                st.session_state.custom_query_result = None
+                st.error(f"Could not use the query result: {str(e)}")
 
     # ----------------------------
     # QUESTION-ANSWER SECTION
@@ -266,7 +453,9 @@ try:
                 print("sdhvhbbbb")
                 start_time = time.time()  # ⏱️ Start timer
                 print("question:", question)
-                response = create_agent_for_dataframe_sheets(dataframes, question)
+                with span("question"):
+                    response = answer_question(dataframes, question, user=st.session_state.username,
+                                               profiles=profiles)
                 print("response:", response)
                 end_time = time.time()  # ⏱️ End timer
                 response_time = round(end_time - start_time, 2)  # In seconds
@@ -276,6 +465,16 @@ try:
             except Exception as e:
                 st.error(f"Error: {e}")
 
+    # ----------------------------
+    # MEMORY SECTION
+    # ----------------------------
+    if dataframes:
+        session_bytes = sum(memory_usage_bytes(df) for _, df, _ in dataframes)
+        st.sidebar.caption(
+            f"🧮 Session data: {session_bytes / 1024 ** 2:.1f} MB "
+            f"(shared store: {frame_store.total_bytes() / 1024 ** 2:.1f} MB, {len(frame_store)} frames)"
+        )
+
     # ----------------------------
     # HISTORY SECTION
     # ----------------------------
@@ -0,0 +1,112 @@
+"""
+Synthetic dataset generators for benchmarks.
+
+The customers/orders generators follow the schema of
+`db/example_data.py::create_sample_sqlite_db`, scaled to any size.
+"""
+import io
+import os
+import sqlite3
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from db.example_data import CUSTOMER_SUMMARY_VIEW, SAMPLE_SCHEMA
+
+
+CITIES = ["New York", "Los Angeles", "Chicago", "Houston", "Phoenix",
+          "Philadelphia", "San Antonio", "San Diego", "Dallas", "San Jose"]
+PRODUCTS = ["Laptop", "Mouse", "Keyboard", "Monitor", "Tablet",
+            "Headphones", "Webcam", "Speaker", "Printer", "Router"]
+
+# Number of customers per scale; orders are generated at ~8 per 5 customers,
+# like the sample database.
+SCALES = {
+    "small": 1_000,
+    "medium": 50_000,
+    "large": 500_000,
+}
+
+
+class NamedBytesIO(io.BytesIO):
+    """Stands in for a Streamlit UploadedFile: file-like with a `.name`."""
+
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+
+
+def generate_customers(n_customers: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, n_customers + 1)
+    return pd.DataFrame({
+        "customer_id": ids,
+        "name": [f"Customer {i}" for i in ids],
+        "email": [f"customer{i}@email.com" for i in ids],
+        "age": rng.integers(18, 80, n_customers),
+        "city": rng.choice(CITIES, n_customers),
+    })
+
+
+def generate_orders(n_orders: int, n_customers: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed + 1)
+    dates = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n_orders), unit="D")
+    return pd.DataFrame({
+        "order_id": np.arange(101, 101 + n_orders),
+        "customer_id": rng.integers(1, n_customers + 1, n_orders),
+        "product": rng.choice(PRODUCTS, n_orders),
+        "amount": rng.gamma(2.0, 100.0, n_orders).round(2),
+        "order_date": dates.strftime("%Y-%m-%d"),
+    })
+
+
+def generate_customers_orders(n_customers: int, seed: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    n_orders = max(1, n_customers * 8 // 5)
+    return generate_customers(n_customers, seed), generate_orders(n_orders, n_customers, seed)
+
+
+def generate_wide_table(n_rows: int, n_numeric: int = 100, n_categorical: int = 20, seed: int = 0) -> pd.DataFrame:
+    """Many columns: mixed numeric and low-cardinality string columns."""
+    rng = np.random.default_rng(seed)
+    data = {f"num_{i}": rng.normal(i, 1 + i % 7, n_rows) for i in range(n_numeric)}
+    for i in range(n_categorical):
+        data[f"cat_{i}"] = rng.choice([f"value_{j}" for j in range(3 + i)], n_rows)
+    return pd.DataFrame(data)
+
+
+def create_scaled_sqlite_db(db_path: str, n_customers: int, seed: int = 0) -> str:
+    """Write a customers/orders database (plus the summary view) of the given size."""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    customers_df, orders_df = generate_customers_orders(n_customers, seed)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SAMPLE_SCHEMA)
+    customers_df.to_sql("customers", conn, if_exists="append", index=False)
+    orders_df.to_sql("orders", conn, if_exists="append", index=False)
+    conn.execute(CUSTOMER_SUMMARY_VIEW)
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def csv_upload(df: pd.DataFrame, name: str = "data.csv") -> NamedBytesIO:
+    return NamedBytesIO(df.to_csv(index=False).encode(), name)
+
+
+def xlsx_upload(sheets: Dict[str, pd.DataFrame], name: str = "workbook.xlsx") -> NamedBytesIO:
+    """A multi-sheet workbook as an upload (requires openpyxl)."""
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        for sheet, df in sheets.items():
+            df.to_excel(writer, sheet_name=sheet, index=False)
+    return NamedBytesIO(buf.getvalue(), name)
+
+
+def multi_sheet_workbook(n_customers: int, seed: int = 0) -> Dict[str, pd.DataFrame]:
+    customers_df, orders_df = generate_customers_orders(n_customers, seed)
+    return {
+        "customers": customers_df,
+        "orders": orders_df,
+        "wide": generate_wide_table(min(n_customers, 10_000), n_numeric=30, n_categorical=5, seed=seed),
+    }
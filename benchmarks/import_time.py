@@ -0,0 +1,108 @@
+"""
+Cold-start import cost of the app's modules, measured with `python -X importtime`.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --modules auth storage chatbot.warmup --top 15
+    python -m benchmarks.import_time --apptest   # also time the login page render
+
+Each module is imported in a fresh interpreter so results reflect a cold
+start. Pass --output to write a JSON report.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+
+# What the login page needs vs what is imported after login
+DEFAULT_MODULES = [
+    "auth",
+    "storage",
+    "chatbot.warmup",
+    "utils.metrics",
+    "data.file_handler",
+    "db.db_connector",
+    "chatbot.agent",
+]
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import(module: str) -> Dict[str, object]:
+    """Import `module` in a fresh interpreter and parse the -X importtime output."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+    )
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append({"module": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+
+    total = next((e["cumulative_us"] for e in entries if e["module"] == module), None)
+    return {
+        "module": module,
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else None,
+        "cumulative_ms": round(total / 1000, 2) if total is not None else None,
+        "imported_modules": len(entries),
+        "slowest": sorted(entries, key=lambda e: e["self_us"], reverse=True),
+    }
+
+
+def measure_login_render(runs: int = 3) -> Optional[Dict[str, float]]:
+    """Time the first script run of app.py (the login page) with Streamlit's AppTest."""
+    code = (
+        "import time\n"
+        "from streamlit.testing.v1 import AppTest\n"
+        "start = time.perf_counter()\n"
+        "at = AppTest.from_file('app.py', default_timeout=60).run()\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stderr.strip().splitlines()[-1] if proc.stderr else "AppTest failed", file=sys.stderr)
+            return None
+        samples.append(float(proc.stdout.strip().splitlines()[-1]))
+    return {"runs": runs, "min_s": round(min(samples), 4), "max_s": round(max(samples), 4)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure cold-start import time")
+    parser.add_argument("--modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to show per module")
+    parser.add_argument("--apptest", action="store_true", help="Also time the login page render")
+    parser.add_argument("--output", help="Write a JSON report here")
+    args = parser.parse_args(argv)
+
+    report = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0], "modules": []}
+    for module in args.modules:
+        result = measure_import(module)
+        result["slowest"] = result["slowest"][:args.top]
+        report["modules"].append(result)
+        if not result["ok"]:
+            print(f"{module:22s} FAILED: {result['error']}")
+            continue
+        print(f"{module:22s} {result['cumulative_ms']:>9.1f} ms  ({result['imported_modules']} modules)")
+        for entry in result["slowest"]:
+            print(f"    {entry['module']:40s} {entry['self_us'] / 1000:>8.1f} ms self")
+
+    if args.apptest:
+        report["login_render"] = measure_login_render()
+        print(f"login page render: {report['login_render']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
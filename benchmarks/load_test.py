@@ -0,0 +1,366 @@
+"""
+Headless load test: N virtual analysts against one app instance.
+
+    python -m benchmarks.load_test --users 1 2 4 8 --sessions 2 --output load_report.json
+
+Every virtual user runs full sessions (login, CSV upload, question, SQLite
+browse with the related-table join, question) in its own thread of one
+process, the way Streamlit runs each browser session's script. The steps
+call the same modules app.py does; Streamlit's AppTest is not thread-safe
+(it swaps a global runtime per run), so it is only used for one end-to-end
+session of the real app.py before the concurrency levels. The LLM is the
+Ollama-compatible stub and the database a generated SQLite file.
+
+For every concurrency level the report has session throughput, p50/p95/p99
+per step, failures, and memory of the app process and its analysis workers.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from benchmarks import datasets
+from benchmarks.run_benchmarks import _git_commit
+from utils import metrics
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+PASSWORD = "load-test"
+QUESTION = "What is the average order amount?"
+STEPS = ["login", "upload", "ask_upload", "db_browse", "ask_db"]
+
+
+def _percentile(ordered: List[float], q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def _rss_mb() -> Optional[float]:
+    """Current resident memory of this process (Linux)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _peak_worker_rss_mb() -> Optional[float]:
+    """Largest peak RSS reported by analysis workers since the last metrics reset.
+
+    Workers are started by the fork server, so RUSAGE_CHILDREN never sees
+    them; each worker reports its own peak with the task result.
+    """
+    peak = metrics.percentile("aivengers_worker_peak_rss_mb", 100)
+    return round(peak, 1) if peak is not None else None
+
+
+def _run_steps(steps: List[tuple], timings: Dict[str, List[float]], failures: Dict[str, int],
+               lock: threading.Lock, label: str) -> bool:
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            with lock:
+                failures[name] = failures.get(name, 0) + 1
+            print(f"  {label} {name} failed: {type(e).__name__}: {e}", file=sys.stderr)
+            return False
+        with lock:
+            timings[name].append(time.perf_counter() - start)
+    return True
+
+
+class ScriptedUser:
+    """One analyst session, replaying what app.py does for each interaction."""
+
+    def __init__(self, username: str, upload: datasets.NamedBytesIO, db_path: str):
+        self.username = username
+        self.upload_file = upload
+        self.db_path = db_path
+        self.dataframes: list = []
+        self.profiles: dict = {}
+
+    def _add_dataset(self, fingerprint: str, name: str, df, dataset_key: Optional[str] = None):
+        from chatbot.precompute import get_precomputer
+        precomputer = get_precomputer()
+        precomputer.submit(fingerprint, name, df, self.username, dataset_key)
+        self.profiles[name] = precomputer.result(fingerprint, "profile")
+        self.dataframes.append((name, df, precomputer.result(fingerprint, "suggestions")))
+
+    def login(self):
+        from auth import authenticate
+        if not authenticate(self.username, PASSWORD):
+            raise RuntimeError("login failed")
+
+    def upload(self):
+        from data.file_handler import load_file_data
+        from data.frame_store import content_key, get_frame_store, sheet_key
+        self.dataframes, self.profiles = [], {}
+        data = self.upload_file.getvalue()
+        file = datasets.NamedBytesIO(data, self.upload_file.name)
+        file_key = content_key(data, file.name)
+        sheets = get_frame_store().get_or_load_sheets(file_key, lambda: load_file_data(file))
+        for name, df in sheets.items():
+            self._add_dataset(sheet_key(file_key, name), name, df, f"{file.name}:{name}")
+
+    def ask(self):
+        from chatbot.worker_pool import answer_question
+        from storage import save_query
+        start = time.time()
+        response = answer_question(self.dataframes, QUESTION, user=self.username, profiles=self.profiles)
+        save_query(self.username, QUESTION, response, round(time.time() - start, 2))
+
+    def db_browse(self):
+        from data.frame_store import get_frame_store
+        from db.db_connector import DatabaseConnector
+        from db.join_graph import build_related_dataset
+        self.dataframes, self.profiles = [], {}
+        connector = DatabaseConnector("sqlite", self.db_path, 0, "", "", "")
+        result = connector.test_connection()
+        if not result["success"]:
+            raise RuntimeError(result["error"])
+        database = connector.get_databases()[0]
+        tables = [table for table in connector.get_tables(database) if table in ("customers", "orders")]
+        store = get_frame_store()
+        for table in tables:
+            fingerprint, df = store.put(connector.fetch_data(table, database))
+            self._add_dataset(fingerprint, table, df, f"sqlite:{self.db_path}:{database}:{table}")
+        joined = build_related_dataset(connector, database, tables)
+        if joined is not None:
+            self.dataframes, self.profiles = [], {}
+            fingerprint, joined_df = store.put(joined[0])
+            self._add_dataset(fingerprint, " ⋈ ".join(tables), joined_df)
+
+    def steps(self) -> List[tuple]:
+        return [("login", self.login), ("upload", self.upload), ("ask_upload", self.ask),
+                ("db_browse", self.db_browse), ("ask_db", self.ask)]
+
+
+class AppTestUser:
+    """The same session driven through the real app.py with Streamlit's AppTest."""
+
+    def __init__(self, username: str, upload: datasets.NamedBytesIO, db_path: str, timeout: float):
+        self.username = username
+        self.upload_file = upload
+        self.db_path = db_path
+        self.timeout = timeout
+        self.at = None
+
+    @staticmethod
+    def _widget(widgets, label: str):
+        for widget in widgets:
+            if widget.label == label:
+                return widget
+        raise LookupError(f"No widget labelled {label!r} on the page")
+
+    def _run(self):
+        self.at.run(timeout=self.timeout)
+        if self.at.exception:
+            raise RuntimeError(self.at.exception[0].message)
+        if self.at.error:
+            raise RuntimeError(self.at.error[0].value)
+
+    def login(self):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(APP_PATH, default_timeout=self.timeout)
+        self._run()
+        self._widget(self.at.text_input, "Username").set_value(self.username)
+        self._widget(self.at.text_input, "Password").set_value(PASSWORD)
+        self._widget(self.at.button, "Login").click()
+        self._run()
+        if not self.at.session_state["logged_in"]:
+            raise RuntimeError("login failed")
+
+    def upload(self):
+        self.at.file_uploader[0].set_value((self.upload_file.name, self.upload_file.getvalue(), "text/csv"))
+        self._run()
+
+    def ask(self):
+        self._widget(self.at.text_input, "❓ Ask a question about the data").set_value(QUESTION)
+        self._widget(self.at.button, "Ask").click()
+        self._run()
+        if not any(element.value == "Answer:" for element in self.at.success):
+            raise RuntimeError("no answer shown")
+
+    def db_browse(self):
+        self.at.file_uploader[0].set_value(None)
+        self._widget(self.at.radio, "Choose data source:").set_value("Database")
+        self._run()
+        self._widget(self.at.selectbox, "Database Type").set_value("SQLite")
+        self._run()
+        self._widget(self.at.text_input, "Database File Path").set_value(self.db_path)
+        self._widget(self.at.button, "🔌 Test Connection").click()
+        self._run()
+        self._widget(self.at.multiselect, "📊 Select Tables/Collections").set_value(["customers", "orders"])
+        self._run()
+
+    def steps(self) -> List[tuple]:
+        return [("login", self.login), ("upload", self.upload), ("ask_upload", self.ask),
+                ("db_browse", self.db_browse), ("ask_db", self.ask)]
+
+
+def _summarize(timings: Dict[str, List[float]]) -> Dict[str, Dict]:
+    steps = {}
+    for name, samples in timings.items():
+        ordered = sorted(samples)
+        steps[name] = {
+            "count": len(ordered),
+            "p50_s": _percentile(ordered, 50),
+            "p95_s": _percentile(ordered, 95),
+            "p99_s": _percentile(ordered, 99),
+            "max_s": ordered[-1] if ordered else None,
+        }
+    return steps
+
+
+def run_apptest_session(upload: datasets.NamedBytesIO, db_path: str, timeout: float) -> Dict:
+    timings: Dict[str, List[float]] = {name: [] for name in STEPS}
+    failures: Dict[str, int] = {}
+    user = AppTestUser("load_user_0", upload, db_path, timeout)
+    ok = _run_steps(user.steps(), timings, failures, threading.Lock(), "apptest")
+    return {"completed": ok, "failures": failures,
+            "steps": {name: samples[0] if samples else None for name, samples in timings.items()}}
+
+
+def run_level(users: int, sessions: int, make_user: Callable[[int], ScriptedUser]) -> Dict:
+    timings: Dict[str, List[float]] = {name: [] for name in STEPS}
+    failures: Dict[str, int] = {}
+    completed = []
+    lock = threading.Lock()
+
+    def drive(index: int):
+        for n in range(sessions):
+            if _run_steps(make_user(index).steps(), timings, failures, lock, f"user {index}"):
+                with lock:
+                    completed.append(n)
+
+    threads = [threading.Thread(target=drive, args=(i,), name=f"virtual-user-{i}") for i in range(users)]
+    metrics.reset()  # per-level worker peaks
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "users": users,
+        "sessions_started": users * sessions,
+        "sessions_completed": len(completed),
+        "failures": failures,
+        "elapsed_s": round(elapsed, 3),
+        "sessions_per_s": round(len(completed) / elapsed, 4) if elapsed else None,
+        "steps": _summarize(timings),
+        "rss_mb": _rss_mb(),
+        "peak_rss_mb": _peak_rss_mb(),
+        "peak_worker_rss_mb": _peak_worker_rss_mb(),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the data assistant with concurrent virtual users")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 2, 4, 8], help="Concurrency levels")
+    parser.add_argument("--sessions", type=int, default=2, help="Sessions per virtual user per level")
+    parser.add_argument("--scale", choices=sorted(datasets.SCALES), default="small")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Stub LLM seconds per completion")
+    parser.add_argument("--shared-upload", action="store_true",
+                        help="Every user uploads the same file (exercises the shared caches)")
+    parser.add_argument("--skip-apptest", action="store_true", help="Skip the end-to-end app.py session")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds allowed per AppTest script run")
+    parser.add_argument("--output", default="load_report.json")
+    args = parser.parse_args(argv)
+
+    # AppTest runs outside a server; its "missing ScriptRunContext" warnings are noise here
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+
+    output = os.path.abspath(args.output)
+    n_customers = datasets.SCALES[args.scale]
+    original_cwd = os.getcwd()
+
+    # Route every LLM call to the stub before the app's modules read their config
+    from chatbot.stub_llm_server import start_stub_server, stub_base_url
+    server = start_stub_server(latency=args.llm_latency)
+    os.environ["OLLAMA_BASE_URL"] = stub_base_url(server)
+    for route in ("ANALYSIS", "SUMMARY", "REPHRASE"):
+        os.environ[f"LLM_{route}_URL"] = stub_base_url(server)
+
+    apptest, levels = None, []
+    with tempfile.TemporaryDirectory() as workdir:
+        # auth.py and storage.py write relative to the working directory
+        os.chdir(workdir)
+        try:
+            db_path = datasets.create_scaled_sqlite_db(os.path.join(workdir, "load.db"), n_customers)
+            max_users = max(args.users)
+            with open("users.json", "w") as f:
+                json.dump({f"load_user_{i}": {"password": PASSWORD} for i in range(max_users)}, f)
+            # One file per user unless asked otherwise, so caches do not hide the upload cost
+            def orders_upload(seed: int) -> datasets.NamedBytesIO:
+                orders = datasets.generate_orders(n_customers * 8 // 5, n_customers, seed=seed)
+                return datasets.csv_upload(orders, f"orders_{seed}.csv")
+
+            uploads = [orders_upload(i) for i in range(1 if args.shared_upload else max_users)]
+
+            if not args.skip_apptest:
+                apptest = run_apptest_session(orders_upload(max_users), db_path, args.timeout)
+                status = "ok" if apptest["completed"] else f"FAILED {apptest['failures']}"
+                print(f"app.py session {status}: "
+                      + "  ".join(f"{name} {value:.2f}s" for name, value in apptest["steps"].items() if value is not None))
+
+            def make_user(index: int) -> ScriptedUser:
+                return ScriptedUser(f"load_user_{index}", uploads[index % len(uploads)], db_path)
+
+            for users in args.users:
+                result = run_level(users, args.sessions, make_user)
+                levels.append(result)
+                p95 = {name: step["p95_s"] for name, step in result["steps"].items()}
+                print(f"users={users:<3d} sessions/s {result['sessions_per_s']:<8} "
+                      f"failures {sum(result['failures'].values()):<3d} rss {result['rss_mb'] or 0:.0f} MB  "
+                      + "  ".join(f"{name} p95 {value:.2f}s" for name, value in p95.items() if value is not None))
+        finally:
+            os.chdir(original_cwd)
+            server.shutdown()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "n_customers": n_customers,
+            "sessions_per_user": args.sessions,
+            "shared_upload": args.shared_upload,
+            "llm_latency_s": args.llm_latency,
+            "analysis_backend": os.environ.get("ANALYSIS_BACKEND", "process"),
+        },
+        "apptest_session": apptest,
+        "levels": levels,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+    failed = any(level["failures"] for level in levels) or (apptest is not None and not apptest["completed"])
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Scenario benchmarks for the data assistant.
+
+    python -m benchmarks.run_benchmarks --scale small --output bench_report.json
+    python -m benchmarks.run_benchmarks --baseline bench_report.json --threshold 0.2
+
+Every scenario runs against synthetic data and, for the agent path, the
+Ollama-compatible stub server with a configurable latency, so results are
+reproducible without a GPU. With --baseline, the run exits non-zero when a
+scenario's median is more than --threshold slower than the baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from benchmarks import datasets
+
+
+def _stats(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    p95_index = max(0, int(round(0.95 * len(ordered))) - 1)
+    return {
+        "runs": len(ordered),
+        "min_s": round(ordered[0], 6),
+        "median_s": round(statistics.median(ordered), 6),
+        "mean_s": round(statistics.fmean(ordered), 6),
+        "p95_s": round(ordered[p95_index], 6),
+        "max_s": round(ordered[-1], 6),
+    }
+
+
+def time_scenario(func: Callable[[], object], repeat: int, warmup: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return _stats(samples)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def build_scenarios(n_customers: int, workdir: str, llm_latency: float) -> Dict[str, Callable[[], object]]:
+    from data.file_handler import load_file_data, suggest_questions
+    from db.db_connector import DatabaseConnector
+    from db.join_graph import build_related_dataset
+    import storage
+
+    customers_df, orders_df = datasets.generate_customers_orders(n_customers)
+    wide_df = datasets.generate_wide_table(min(n_customers, 20_000))
+    csv_bytes = orders_df.to_csv(index=False).encode()
+    db_path = datasets.create_scaled_sqlite_db(os.path.join(workdir, "bench.db"), n_customers)
+    connector = DatabaseConnector("sqlite", db_path, 0, "", "", "")
+
+    scenarios = {
+        "ingest_csv": lambda: load_file_data(datasets.NamedBytesIO(csv_bytes, "orders.csv")),
+        "profile_orders": lambda: suggest_questions(orders_df),
+        "profile_wide": lambda: suggest_questions(wide_df),
+        "db_fetch_table": lambda: connector.fetch_data("orders", db_path, limit=1000),
+        "db_fetch_join": lambda: build_related_dataset(connector, db_path, ["customers", "orders"], limit=1000),
+    }
+
+    try:
+        import openpyxl  # noqa: F401
+        workbook = datasets.xlsx_upload(datasets.multi_sheet_workbook(min(n_customers, 5_000)))
+        xlsx_bytes = workbook.getvalue()
+        scenarios["ingest_xlsx"] = lambda: load_file_data(datasets.NamedBytesIO(xlsx_bytes, "workbook.xlsx"))
+    except ImportError:
+        pass
+
+    history_user = "bench_user"
+
+    def history_roundtrip():
+        storage.save_query(history_user, "How many orders?", "42", 0.1)
+        return storage.get_query_history(history_user)
+
+    scenarios["history_storage"] = history_roundtrip
+
+    try:
+        from chatbot.stub_llm_server import start_stub_server, stub_base_url
+        server = start_stub_server(latency=llm_latency)
+        os.environ["OLLAMA_BASE_URL"] = stub_base_url(server)
+        for route in ("ANALYSIS", "SUMMARY", "REPHRASE"):
+            os.environ[f"LLM_{route}_URL"] = stub_base_url(server)
+        from chatbot.agent import create_agent_for_dataframe_sheets, rephrase_prompts
+
+        sheets = [("customers", customers_df, []), ("orders", orders_df, [])]
+        scenarios["agent_question"] = lambda: create_agent_for_dataframe_sheets(
+            sheets, "What is the average order amount?")
+        scenarios["rephrase_suggestions"] = lambda: rephrase_prompts(suggest_questions(orders_df))
+    except ImportError as e:
+        print(f"Skipping agent scenarios: {e}", file=sys.stderr)
+
+    return scenarios
+
+
+def compare(report: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Scenarios whose median regressed by more than `threshold` (fraction)."""
+    regressions = []
+    for name, result in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("median_s"):
+            continue
+        change = result["median_s"] / base["median_s"] - 1
+        result["change_vs_baseline"] = round(change, 4)
+        if change > threshold:
+            regressions.append(f"{name}: {base['median_s']}s -> {result['median_s']}s (+{change:.0%})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run data assistant benchmarks")
+    parser.add_argument("--scale", choices=sorted(datasets.SCALES), default="small")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="*", help="Run only these scenarios")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Stub LLM seconds per completion")
+    parser.add_argument("--output", default="bench_report.json")
+    parser.add_argument("--baseline", help="Previous report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed median slowdown, e.g. 0.2 = 20%%")
+    args = parser.parse_args(argv)
+
+    n_customers = datasets.SCALES[args.scale]
+    original_cwd = os.getcwd()
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # storage.py writes relative to the working directory
+        os.chdir(workdir)
+        try:
+            scenarios = build_scenarios(n_customers, workdir, args.llm_latency)
+            results = {}
+            for name, func in scenarios.items():
+                if args.only and name not in args.only:
+                    continue
+                results[name] = time_scenario(func, args.repeat)
+                print(f"{name:24s} median {results[name]['median_s']:.4f}s  p95 {results[name]['p95_s']:.4f}s")
+        finally:
+            os.chdir(original_cwd)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "n_customers": n_customers,
+            "repeat": args.repeat,
+            "llm_latency_s": args.llm_latency,
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        report["regressions"] = regressions
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,9 @@
 import pandas as pd
-import matplotlib.pyplot as plt
 from typing import Optional, Tuple, Union
-from langchain_experimental.agents import create_pandas_dataframe_agent
-from langchain_ollama import OllamaLLM
+from chatbot.llm_gateway import get_llm, llm_slot, batch, route_config
+from utils.metrics import span
+from prompts.prompt_templates import build_dataset_context
+from data.frame_store import analysis_frame
 import io
 import base64
 
@@ -14,28 +15,39 @@ def plot_to_base64(fig):
     return base64.b64encode(buf.getvalue()).decode()
 
 
-def create_agent_for_dataframe_sheets(sheets_dfs: dict, question: Optional[str] = None) -> Union[dict, str]:
-    combined_df = None
-    for sheet, df,_ in sheets_dfs:
-        df = df.copy()
-        df["sheet_name"] = sheet
-        combined_df = pd.concat([combined_df, df], ignore_index=True) if combined_df is not None else df
+def create_agent_for_dataframe_sheets(sheets_dfs: dict, question: Optional[str] = None,
+                                      user: Optional[str] = None, route: str = "analysis",
+                                      profiles: Optional[dict] = None) -> Union[dict, str]:
+    with span("agent_build", route=route):
+        # One copy per sheet (assign) and a single concat, instead of
+        # copying every sheet and re-concatenating the growing frame.
+        # Categoricals from the frame store become plain columns again
+        frames = [analysis_frame(df).assign(sheet_name=sheet) for sheet, df, _ in sheets_dfs]
+        combined_df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
 
-    llm = OllamaLLM(model="llama3:8b")
-    agent = create_pandas_dataframe_agent(
-        llm=llm,
-        df=combined_df,
-        verbose=False,
-        allow_dangerous_code=True
-    )
+        from langchain_experimental.agents import create_pandas_dataframe_agent
+
+        llm = get_llm(route)
+        agent = create_pandas_dataframe_agent(
+            llm=llm,
+            df=combined_df,
+            verbose=False,
+            allow_dangerous_code=True
+        )
 
     if question:
-        response = agent.invoke({"input": f"Only return the final answer. Do not explain. {question}"})
+        # Each LLM round-trip inside the agent is recorded as its own llm_call span
+        with llm_slot(user), span("agent_run", route=route):
+            context = build_dataset_context(profiles)
+            response = agent.invoke({"input": f"{context}Only return the final answer. Do not explain. {question}"},
+                                    config=route_config(route))
         output = response.get("output", "No output found")
 
         # Try generating plot if requested
         if any(x in question.lower() for x in ["plot", "chart", "graph", "visualize"]):
             try:
+                import matplotlib.pyplot as plt
+
                 # You can customize this based on your domain
                 fig, ax = plt.subplots()
                 combined_df.plot(ax=ax)  # Customize this depending on the user query
@@ -55,20 +67,25 @@ def create_agent_for_dataframe_sheets(sheets_dfs: dict, question: Optional[str]
     return agent
 
 
-def rephrase_prompts(prompts: list[str], max_prompts: int = 10) -> list[str]:
-    conversational_prompts = []
-    llm = OllamaLLM(model="llama3:8b")
+def rephrase_prompts(prompts: list[str], max_prompts: int = 10, user: Optional[str] = None) -> list[str]:
+    prompts = prompts[:max_prompts]
+    llm_inputs = [
+        f"Rephrase the following analytical question to be more natural and conversational for a user interface. "
+        f"Keep it friendly and precise:\n\n"
+        f"{prompt}"
+        for prompt in prompts
+    ]
+    try:
+        with span("rephrase"):
+            results = batch("rephrase", llm_inputs, user=user)
+    except Exception:
+        return list(prompts)  # fallback
 
-    for prompt in prompts[:max_prompts]:
-        llm_input = (
-           f"Rephrase the following analytical question to be more natural and conversational for a user interface. "
-            f"Keep it friendly and precise:\n\n"
-            f"{prompt}"
-        )
-        try:
-            refined = llm(llm_input).strip()
-            conversational_prompts.append(refined)
-        except Exception as e:
+    conversational_prompts = []
+    for prompt, refined in zip(prompts, results):
+        if isinstance(refined, Exception) or not refined.strip():
             conversational_prompts.append(prompt)  # fallback
+        else:
+            conversational_prompts.append(refined.strip())
 
-    return conversational_prompts
\ No newline at end of file
+    return conversational_prompts
@@ -0,0 +1,274 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from utils.metrics import inc, record_span, span
+
+if TYPE_CHECKING:
+    from langchain_ollama import OllamaLLM
+
+
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "120"))
+LLM_KEEP_ALIVE = os.environ.get("LLM_KEEP_ALIVE", "30m")
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("LLM_MAX_CONCURRENCY", "4"))
+MAX_CONCURRENT_PER_USER = int(os.environ.get("LLM_MAX_CONCURRENCY_PER_USER", "2"))
+MAX_BATCH_SIZE = int(os.environ.get("LLM_BATCH_SIZE", "8"))
+SLOT_WAIT_TIMEOUT = float(os.environ.get("LLM_SLOT_WAIT_TIMEOUT", "300"))
+MAX_CONCURRENT_BACKGROUND = int(os.environ.get("LLM_BACKGROUND_CONCURRENCY", "1"))
+
+# Which model / endpoint serves which kind of request. Small requests
+# (rephrasing, summaries) can be routed to a lighter model, e.g.
+# LLM_REPHRASE_MODEL=llama3.2:1b, while analysis stays on the 8B model.
+MODEL_ROUTES: Dict[str, Dict[str, str]] = {
+    "analysis": {
+        "model": os.environ.get("LLM_ANALYSIS_MODEL", "llama3:8b"),
+        "base_url": os.environ.get("LLM_ANALYSIS_URL", OLLAMA_BASE_URL),
+    },
+    "summary": {
+        "model": os.environ.get("LLM_SUMMARY_MODEL", "llama3:8b"),
+        "base_url": os.environ.get("LLM_SUMMARY_URL", OLLAMA_BASE_URL),
+    },
+    "rephrase": {
+        "model": os.environ.get("LLM_REPHRASE_MODEL", "llama3:8b"),
+        "base_url": os.environ.get("LLM_REPHRASE_URL", OLLAMA_BASE_URL),
+    },
+}
+
+_clients: Dict[Tuple[str, str], "OllamaLLM"] = {}
+_clients_lock = threading.Lock()
+_call_spans = None
+
+
+
+class LLMBusyError(RuntimeError):
+    """Raised when no LLM slot frees up within SLOT_WAIT_TIMEOUT."""
+
+
+class SlotPool:
+    """Counting semaphore in which background callers yield to interactive ones.
+
+    A background acquire only succeeds while no interactive caller is waiting,
+    and at most `background_size` slots are held by background callers.
+    """
+
+    def __init__(self, size: int, background_size: Optional[int] = None):
+        self.size = size
+        self.background_size = size if background_size is None else min(size, background_size)
+        self._in_use = 0
+        self._background_in_use = 0
+        self._interactive_waiting = 0
+        self._cond = threading.Condition()
+
+    def _available(self, background: bool) -> bool:
+        if self._in_use >= self.size:
+            return False
+        return not background or (not self._interactive_waiting and self._background_in_use < self.background_size)
+
+    def acquire(self, timeout: Optional[float] = None, background: bool = False) -> bool:
+        with self._cond:
+            if not background:
+                self._interactive_waiting += 1
+            try:
+                acquired = self._cond.wait_for(lambda: self._available(background), timeout)
+                if acquired:
+                    self._in_use += 1
+                    self._background_in_use += background
+                return acquired
+            finally:
+                if not background:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+    def release(self, background: bool = False):
+        with self._cond:
+            self._in_use -= 1
+            self._background_in_use -= background
+            self._cond.notify_all()
+
+
+_global_slots = SlotPool(MAX_CONCURRENT_REQUESTS, MAX_CONCURRENT_BACKGROUND)
+_user_slots: Dict[str, threading.BoundedSemaphore] = {}
+_user_slots_lock = threading.Lock()
+_priority = threading.local()
+
+
+def get_route(route: str) -> Dict[str, str]:
+    if route not in MODEL_ROUTES:
+        raise ValueError(f"Unknown LLM route: {route}")
+    return MODEL_ROUTES[route]
+
+
+def _llm_call_spans():
+    """Callback handler recording one "llm_call" span per completion.
+
+    Agents make several LLM round-trips per question with code execution in
+    between; a callback on the client times each request on its own. The
+    route comes from the run metadata (see `route_config`).
+    """
+    global _call_spans
+    if _call_spans is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class LLMCallSpans(BaseCallbackHandler):
+            def __init__(self):
+                self._starts: Dict[Any, Tuple[float, Optional[str]]] = {}
+                self._lock = threading.Lock()
+
+            def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+                with self._lock:
+                    self._starts[run_id] = (time.perf_counter(), (metadata or {}).get("route"))
+
+            def _finish(self, run_id, error: Optional[str]):
+                with self._lock:
+                    start, route = self._starts.pop(run_id, (None, None))
+                if start is not None:
+                    record_span("llm_call", time.perf_counter() - start, error, route=route)
+
+            def on_llm_end(self, response, *, run_id, **kwargs):
+                self._finish(run_id, None)
+
+            def on_llm_error(self, error, *, run_id, **kwargs):
+                self._finish(run_id, type(error).__name__)
+
+        _call_spans = LLMCallSpans()
+    return _call_spans
+
+
+def route_config(route: str) -> Dict[str, Any]:
+    """Run config tagging LLM calls with their route, for the llm_call spans."""
+    return {"metadata": {"route": route}}
+
+
+def get_llm(route: str = "analysis") -> "OllamaLLM":
+    """Return the shared client for a route.
+
+    Clients are created once per (model, endpoint) and reused across sessions,
+    so the underlying HTTP connection pool and keep-alive are shared too.
+    """
+    config = get_route(route)
+    key = (config["model"], config["base_url"])
+    with _clients_lock:
+        llm = _clients.get(key)
+        if llm is None:
+            # Imported on first use: langchain is slow to import and not
+            # needed to render the login page
+            from langchain_ollama import OllamaLLM
+
+            llm = OllamaLLM(
+                model=config["model"],
+                base_url=config["base_url"],
+                keep_alive=LLM_KEEP_ALIVE,
+                client_kwargs={"timeout": LLM_TIMEOUT},
+                callbacks=[_llm_call_spans()],
+            )
+            _clients[key] = llm
+        return llm
+
+
+def _user_semaphore(user: str) -> threading.BoundedSemaphore:
+    with _user_slots_lock:
+        sem = _user_slots.get(user)
+        if sem is None:
+            sem = threading.BoundedSemaphore(MAX_CONCURRENT_PER_USER)
+            _user_slots[user] = sem
+        return sem
+
+
+@contextmanager
+def background_priority():
+    """Run this thread's LLM calls as background work.
+
+    Background calls do not count against any user's slots. At most
+    LLM_BACKGROUND_CONCURRENCY of them are in flight, and they only take a
+    global slot while no interactive request is waiting for one.
+    """
+    previous = getattr(_priority, "background", False)
+    _priority.background = True
+    try:
+        yield
+    finally:
+        _priority.background = previous
+
+
+def in_background() -> bool:
+    return getattr(_priority, "background", False)
+
+
+@contextmanager
+def _user_slot(user: Optional[str], background: bool = False):
+    user_sem = _user_semaphore(user) if user and not background else None
+    if user_sem is not None and not user_sem.acquire(timeout=SLOT_WAIT_TIMEOUT):
+        inc("aivengers_llm_rejected_total", help="LLM requests rejected for lack of a slot", scope="user")
+        raise LLMBusyError(f"Too many concurrent LLM requests for user {user}")
+    try:
+        yield
+    finally:
+        if user_sem is not None:
+            user_sem.release()
+
+
+@contextmanager
+def _global_slot(background: bool = False):
+    with span("llm_slot_wait"):
+        acquired = _global_slots.acquire(SLOT_WAIT_TIMEOUT, background=background)
+    if not acquired:
+        inc("aivengers_llm_rejected_total", help="LLM requests rejected for lack of a slot", scope="global")
+        raise LLMBusyError("LLM gateway is busy, please try again")
+    try:
+        yield
+    finally:
+        _global_slots.release(background)
+
+
+@contextmanager
+def llm_slot(user: Optional[str] = None):
+    """Hold one global (and, if given, one per-user) LLM concurrency slot.
+
+    Inside `background_priority()` the background budget is used instead of
+    the user's slots.
+    """
+    background = in_background()
+    with _user_slot(user, background), _global_slot(background):
+        yield
+
+
+def invoke(route: str, prompt: str, user: Optional[str] = None) -> str:
+    """Run a single completion on the given route."""
+    llm = get_llm(route)
+    with llm_slot(user):
+        return llm.invoke(prompt, config=route_config(route))
+
+
+def batch(route: str, prompts: List[str], user: Optional[str] = None) -> List[object]:
+    """Run many small prompts as micro-batches under one per-user slot.
+
+    Prompts within a micro-batch are sent concurrently (OllamaLLM.batch
+    would send them one after another), each holding its own global slot, so
+    MAX_CONCURRENT_REQUESTS still bounds what is in flight at the server.
+    Failed prompts come back as exception instances so callers can fall back
+    per item instead of losing the whole batch.
+    """
+    if not prompts:
+        return []
+    llm = get_llm(route)
+    background = in_background()  # pool threads do not inherit the caller's priority
+
+    def complete(prompt: str) -> object:
+        try:
+            with _global_slot(background):
+                return llm.invoke(prompt, config=route_config(route))
+        except Exception as e:
+            return e
+
+    results: List[object] = []
+    with _user_slot(user, background):
+        for start in range(0, len(prompts), MAX_BATCH_SIZE):
+            chunk = prompts[start:start + MAX_BATCH_SIZE]
+            workers = min(len(chunk), MAX_CONCURRENT_BACKGROUND if background else MAX_CONCURRENT_REQUESTS)
+            with span("llm_batch", route=route), ThreadPoolExecutor(workers) as pool:
+                results.extend(pool.map(complete, chunk))
+    return results
@@ -0,0 +1,261 @@
+"""
+Background precomputation of per-dataset results.
+
+As soon as a sheet or table is loaded, its profile, suggested questions and
+summary are queued for background threads, in that priority order across
+all loaded datasets. Jobs only hold a weak reference to the frame, so a
+dataset nobody has loaded any more is not kept alive by queued or unrequested
+jobs (e.g. summaries with PRECOMPUTE_SUMMARIES=0). Results are kept under the dataset's content
+fingerprint (the frame store key), so Streamlit reruns, the "Generate
+summary" checkbox and suggestion clicks reuse them instead of recomputing.
+Asking for a result that has not started yet runs it right away in the
+caller's thread rather than waiting behind the queue.
+
+Results are shared by every session, so jobs do not run on behalf of any one
+user: they hold no per-user LLM slots, summaries use the gateway's background
+budget, which yields to interactive requests, and the profile is saved to the
+stored profile of each user who loads the dataset.
+"""
+import itertools
+import os
+import queue
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from utils.metrics import inc, span
+
+
+PRECOMPUTE_WORKERS = int(os.environ.get("PRECOMPUTE_WORKERS", "2"))
+PRECOMPUTE_MAX_DATASETS = int(os.environ.get("PRECOMPUTE_MAX_DATASETS", "256"))
+PRECOMPUTE_SUMMARIES = os.environ.get("PRECOMPUTE_SUMMARIES", "1") == "1"
+
+SUMMARY_QUESTION = "Give a short summary of this dataset."
+
+# Lower runs first: profiles and suggestions are shown on every load,
+# summaries only when the user asks for them
+PRIORITIES = {"profile": 0, "suggestions": 1, "summary": 2}
+# Speculative jobs: nobody is waiting for them yet, so their LLM and worker
+# use yields to interactive requests
+BACKGROUND_KINDS = {"summary"}
+
+
+class Job:
+    def __init__(self, kind: str, func: Callable[[], Any]):
+        self.kind = kind
+        self.func: Optional[Callable[[], Any]] = func
+        self.state = "queued"  # "queued", "running", "done" or "failed"
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def claim(self) -> bool:
+        with self._lock:
+            if self.state != "queued":
+                return False
+            self.state = "running"
+            return True
+
+    def run(self):
+        try:
+            with span("precompute", kind=self.kind):
+                self.result = self.func()
+            self.state = "done"
+            self.func = None  # drop the frame reference once there is nothing to retry
+        except Exception as e:
+            self.error = e
+            self.state = "failed"
+        finally:
+            self.done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> Any:
+        if self.claim():
+            self.run()
+        elif self.state == "done":
+            inc("aivengers_precompute_hits_total", help="Precomputed results served without waiting", kind=self.kind)
+        elif not self.done.wait(timeout):
+            raise TimeoutError(f"Timed out waiting for {self.kind}")
+        if self.state == "failed":
+            raise self.error
+        return self.result
+
+    def reset(self):
+        """Make a failed job runnable again."""
+        with self._lock:
+            if self.state == "failed":
+                self.state, self.error = "queued", None
+                self.done.clear()
+
+
+class ProfileOwners:
+    """The (username, dataset_key) pairs that loaded a dataset.
+
+    The shared profile starts from the first stored profile it extends and is
+    saved for every owner, including owners that arrive once it is computed.
+    """
+
+    def __init__(self):
+        self.pending: List[Tuple[str, str]] = []
+        self.saved: Set[Tuple[str, str]] = set()
+        self.profile = None
+        self._lock = threading.Lock()
+
+    def add(self, username: Optional[str], dataset_key: Optional[str]):
+        if not username or not dataset_key:
+            return
+        owner = (username, dataset_key)
+        with self._lock:
+            if owner in self.saved or owner in self.pending:
+                return
+            self.pending.append(owner)
+            if self.profile is not None:
+                self._save()
+
+    def compute(self, df: pd.DataFrame):
+        from data.profile import DatasetProfile, extend_profile, load_profile
+
+        with self._lock:
+            owners = list(self.pending)
+        profile = None
+        for username, dataset_key in owners:
+            stored = load_profile(username, dataset_key)
+            if extend_profile(stored, df):
+                profile = stored
+                break
+        if profile is None:
+            profile = DatasetProfile.from_frame(df)
+        with self._lock:
+            self.profile = profile
+            self._save()
+        return profile
+
+    def _save(self):
+        from data.profile import save_profile
+
+        for username, dataset_key in self.pending:
+            save_profile(username, dataset_key, self.profile)
+            self.saved.add((username, dataset_key))
+        self.pending.clear()
+
+
+class Precomputer:
+    """Priority queue of per-dataset jobs served by daemon threads."""
+
+    def __init__(self, workers: int = PRECOMPUTE_WORKERS, max_datasets: int = PRECOMPUTE_MAX_DATASETS,
+                 summaries: bool = PRECOMPUTE_SUMMARIES):
+        self.workers = workers
+        self.max_datasets = max_datasets
+        self.summaries = summaries
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._jobs: "OrderedDict[str, Dict[str, Job]]" = OrderedDict()
+        self._owners: Dict[str, ProfileOwners] = {}
+        self._frames: Dict[str, "weakref.ref[pd.DataFrame]"] = {}
+        self._threads: list = []
+        self._lock = threading.Lock()
+
+    def submit(self, fingerprint: str, name: str, df: pd.DataFrame, username: Optional[str] = None,
+               dataset_key: Optional[str] = None) -> str:
+        """Queue profile, suggestions and (optionally) summary for a dataset, once per fingerprint.
+
+        `username` and `dataset_key` name the stored profile to reuse and
+        update (see `data.profile.profile_dataset`); every caller's is kept.
+        """
+        from chatbot.agent import rephrase_prompts
+        from chatbot.worker_pool import answer_question
+        from data.file_handler import suggest_questions
+
+        jobs: Optional[Dict[str, Job]] = None
+        frame = lambda: self._frame(fingerprint)
+        with self._lock:
+            # Refreshed on every submit, since callers may hold a different
+            # frame object with the same content
+            self._frames[fingerprint] = weakref.ref(df)
+            if fingerprint in self._jobs:
+                self._jobs.move_to_end(fingerprint)
+                owners = self._owners[fingerprint]
+            else:
+                owners = self._owners[fingerprint] = ProfileOwners()
+                jobs = {}
+                jobs["profile"] = Job("profile", lambda: owners.compute(frame()))
+                jobs["suggestions"] = Job("suggestions", lambda: rephrase_prompts(
+                    suggest_questions(frame(), profile=jobs["profile"].wait())))
+                jobs["summary"] = Job("summary", lambda: answer_question(
+                    [(name, frame(), [])], SUMMARY_QUESTION, route="summary"))
+                self._jobs[fingerprint] = jobs
+                while len(self._jobs) > self.max_datasets:
+                    evicted, _ = self._jobs.popitem(last=False)
+                    self._owners.pop(evicted, None)
+                    self._frames.pop(evicted, None)
+        owners.add(username, dataset_key)
+        if jobs is None:
+            return fingerprint
+
+        for kind, job in jobs.items():
+            if kind != "summary" or self.summaries:
+                self._queue.put((PRIORITIES[kind], next(self._order), job))
+        self._start_workers()
+        return fingerprint
+
+    def result(self, fingerprint: str, kind: str, timeout: Optional[float] = None) -> Any:
+        """The `kind` result for a submitted dataset, waiting for (or running) the job if needed.
+
+        A failed job raises its error and is retried on the next call.
+        """
+        with self._lock:
+            job = self._jobs[fingerprint][kind]
+        try:
+            return job.wait(timeout)
+        except Exception:
+            job.reset()
+            raise
+
+    def _frame(self, fingerprint: str) -> pd.DataFrame:
+        with self._lock:
+            ref = self._frames.get(fingerprint)
+        df = ref() if ref is not None else None
+        if df is None:
+            raise LookupError(f"Dataset {fingerprint} is no longer loaded; load it again")
+        return df
+
+    def status(self, fingerprint: str) -> Dict[str, str]:
+        with self._lock:
+            jobs = self._jobs.get(fingerprint, {})
+            return {kind: job.state for kind, job in jobs.items()}
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _start_workers(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"precompute-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        from chatbot.llm_gateway import background_priority
+
+        while True:
+            _, _, job = self._queue.get()
+            if job.claim():
+                with background_priority() if job.kind in BACKGROUND_KINDS else nullcontext():
+                    job.run()
+
+
+_precomputer: Optional[Precomputer] = None
+_precomputer_lock = threading.Lock()
+
+
+def get_precomputer() -> Precomputer:
+    """The process-wide precomputer shared by every session."""
+    global _precomputer
+    with _precomputer_lock:
+        if _precomputer is None:
+            _precomputer = Precomputer()
+        return _precomputer
@@ -0,0 +1,118 @@
+"""
+Minimal Ollama-compatible stub server for tests and load benchmarks.
+
+Point the app at it with OLLAMA_BASE_URL=http://localhost:11435 and run:
+
+    python -m chatbot.stub_llm_server --port 11435 --latency 0.2
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+STUB_ANSWER = "Final Answer: This is a stub answer."
+
+
+def _stub_completion(prompt: str) -> str:
+    # Rephrase requests put the question on the last line; echo it back so
+    # suggested questions still look sensible in the UI.
+    if prompt.startswith("Rephrase the following"):
+        return prompt.strip().splitlines()[-1]
+    return STUB_ANSWER
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without TCP_NODELAY keep-alive
+    # clients stall ~40ms per response on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path in ("/", "/api/version"):
+            self._send_json({"version": "stub"})
+        elif self.path == "/api/tags":
+            self._send_json({"models": []})
+        elif self.path == "/api/ps":
+            self._send_json({"models": []})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/api/generate":
+            self._send_json({"error": "not found"}, status=404)
+            return
+
+        time.sleep(self.latency)
+        prompt = request.get("prompt", "")
+        chunk = {
+            "model": request.get("model", "stub"),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "response": _stub_completion(prompt) if prompt else "",
+            "done": True,
+            "done_reason": "stop",
+        }
+        if not request.get("stream", True):
+            self._send_json(chunk)
+            return
+
+        # Streaming responses are newline-delimited JSON, ending with done=true
+        lines = [dict(chunk, done=False), dict(chunk, response="")]
+        body = "".join(json.dumps(line) + "\n" for line in lines).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_stub_server(port: int = 0, latency: float = 0.0, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Start the stub in a daemon thread; port 0 picks a free port."""
+    handler = type("StubHandler", (StubOllamaHandler,), {"latency": latency})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def stub_base_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Ollama-compatible stub LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait per completion")
+    args = parser.parse_args(argv)
+
+    server = start_stub_server(args.port, args.latency, args.host)
+    print(f"Stub LLM server listening on {stub_base_url(server)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
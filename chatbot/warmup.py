@@ -0,0 +1,197 @@
+"""
+Ollama model warm-up, keep-alive and latency probes.
+
+Models are preloaded at startup and pinged in the background so they stay
+resident during working hours; outside those hours Ollama is allowed to
+unload them after the normal LLM_KEEP_ALIVE period.
+"""
+import json
+import os
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from chatbot.llm_gateway import LLM_KEEP_ALIVE, MODEL_ROUTES
+from utils.metrics import observe
+
+
+WORK_HOURS = os.environ.get("LLM_WORK_HOURS", "8-19")  # [start, end) local hour
+WORK_DAYS = os.environ.get("LLM_WORK_DAYS", "0-4")  # Monday=0
+WORK_HOURS_KEEP_ALIVE = os.environ.get("LLM_WORK_HOURS_KEEP_ALIVE", "2h")
+KEEP_ALIVE_INTERVAL = float(os.environ.get("LLM_KEEP_ALIVE_INTERVAL", "600"))
+PROBE_TIMEOUT = float(os.environ.get("LLM_PROBE_TIMEOUT", "300"))
+HEALTH_TTL = float(os.environ.get("LLM_HEALTH_TTL", "30"))
+MAX_LATENCY_SAMPLES = 200
+
+_latency_samples: List[Dict[str, Any]] = []
+_samples_lock = threading.Lock()
+_keep_alive_thread: Optional[threading.Thread] = None
+_stop_event = threading.Event()
+_health: Dict[str, Dict[str, Any]] = {}
+_health_refreshing: Set[str] = set()
+_health_lock = threading.Lock()
+
+
+def _parse_range(spec: str) -> Tuple[int, int]:
+    start, end = spec.split("-")
+    return int(start), int(end)
+
+
+def in_working_hours(now: Optional[datetime] = None) -> bool:
+    now = now or datetime.now()
+    first_day, last_day = _parse_range(WORK_DAYS)
+    start_hour, end_hour = _parse_range(WORK_HOURS)
+    return first_day <= now.weekday() <= last_day and start_hour <= now.hour < end_hour
+
+
+def keep_alive_for(now: Optional[datetime] = None) -> str:
+    """Keep-alive to request from Ollama: long during working hours, default otherwise."""
+    return WORK_HOURS_KEEP_ALIVE if in_working_hours(now) else LLM_KEEP_ALIVE
+
+
+def configured_models() -> Set[Tuple[str, str]]:
+    return {(route["model"], route["base_url"]) for route in MODEL_ROUTES.values()}
+
+
+def _request(base_url: str, path: str, payload: Optional[dict] = None, timeout: float = PROBE_TIMEOUT):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(
+        base_url.rstrip("/") + path,
+        data=data,
+        headers={"Content-Type": "application/json"},
+        method="POST" if payload is not None else "GET",
+    )
+    return urllib.request.urlopen(req, timeout=timeout)
+
+
+def probe_health(base_url: str) -> Dict[str, Any]:
+    """Check that an Ollama endpoint answers and how fast."""
+    start = time.perf_counter()
+    try:
+        with _request(base_url, "/api/version", timeout=2) as resp:
+            version = json.loads(resp.read() or b"{}").get("version")
+        health = {"success": True, "version": version, "latency": round(time.perf_counter() - start, 4)}
+    except Exception as e:
+        health = {"success": False, "error": str(e)}
+    with _health_lock:
+        _health[base_url] = dict(health, checked_at=time.time())
+    return health
+
+
+def _refresh_health(base_url: str):
+    try:
+        probe_health(base_url)
+    finally:
+        with _health_lock:
+            _health_refreshing.discard(base_url)
+
+
+def health_status(base_url: str) -> Optional[Dict[str, Any]]:
+    """Last probe result for an endpoint, without blocking the caller.
+
+    Results older than HEALTH_TTL are refreshed in a background thread;
+    None means the endpoint has not been probed yet.
+    """
+    with _health_lock:
+        health = _health.get(base_url)
+        stale = health is None or time.time() - health["checked_at"] > HEALTH_TTL
+        if stale and base_url not in _health_refreshing:
+            _health_refreshing.add(base_url)
+            threading.Thread(target=_refresh_health, args=(base_url,), name="llm-health", daemon=True).start()
+    return health
+
+
+def loaded_models(base_url: str) -> Set[str]:
+    """Models currently resident in memory on the endpoint."""
+    try:
+        with _request(base_url, "/api/ps", timeout=5) as resp:
+            return {m.get("name") for m in json.loads(resp.read() or b"{}").get("models", [])}
+    except Exception:
+        return set()
+
+
+def measure_first_token_latency(model: str, base_url: str, keep_alive: Optional[str] = None) -> Dict[str, Any]:
+    """Time until the first streamed token, labelled cold or warm."""
+    state = "warm" if model in loaded_models(base_url) else "cold"
+    payload = {
+        "model": model,
+        "prompt": "Hi",
+        "stream": True,
+        "keep_alive": keep_alive or keep_alive_for(),
+        "options": {"num_predict": 1},
+    }
+    start = time.perf_counter()
+    try:
+        with _request(base_url, "/api/generate", payload) as resp:
+            resp.readline()
+            first_token = time.perf_counter() - start
+            resp.read()
+    except Exception as e:
+        return {"model": model, "base_url": base_url, "state": state, "error": str(e)}
+
+    sample = {
+        "model": model,
+        "base_url": base_url,
+        "state": state,
+        "first_token_s": round(first_token, 4),
+        "timestamp": time.time(),
+    }
+    observe("aivengers_llm_first_token_seconds", first_token,
+            help="Time to first token from Ollama, cold vs warm model", model=model, state=state)
+    with _samples_lock:
+        _latency_samples.append(sample)
+        del _latency_samples[:-MAX_LATENCY_SAMPLES]
+    return sample
+
+
+def warm_up_models(models: Optional[Set[Tuple[str, str]]] = None) -> List[Dict[str, Any]]:
+    """Load every configured model into memory and record first-token latency."""
+    results = []
+    for model, base_url in sorted(models or configured_models()):
+        if not probe_health(base_url)["success"]:
+            results.append({"model": model, "base_url": base_url, "error": "endpoint unreachable"})
+            continue
+        results.append(measure_first_token_latency(model, base_url))
+    return results
+
+
+def _keep_alive_loop(interval: float):
+    warm_up_models()
+    while not _stop_event.wait(interval):
+        if in_working_hours():
+            warm_up_models()
+
+
+def start_background_warmup(interval: float = KEEP_ALIVE_INTERVAL) -> threading.Thread:
+    """Warm up now and keep models resident during working hours. Idempotent."""
+    global _keep_alive_thread
+    if _keep_alive_thread is None or not _keep_alive_thread.is_alive():
+        _stop_event.clear()
+        _keep_alive_thread = threading.Thread(
+            target=_keep_alive_loop, args=(interval,), name="llm-keep-alive", daemon=True
+        )
+        _keep_alive_thread.start()
+    return _keep_alive_thread
+
+
+def stop_background_warmup():
+    _stop_event.set()
+
+
+def get_latency_report() -> Dict[str, Dict[str, Any]]:
+    """Cold vs warm first-token latency per model."""
+    report: Dict[str, Dict[str, Any]] = {}
+    with _samples_lock:
+        samples = list(_latency_samples)
+    for sample in samples:
+        entry = report.setdefault(sample["model"], {"cold": [], "warm": []})
+        entry[sample["state"]].append(sample["first_token_s"])
+    for entry in report.values():
+        for state in ("cold", "warm"):
+            values = entry.pop(state)
+            entry[f"{state}_count"] = len(values)
+            entry[f"{state}_avg_s"] = round(sum(values) / len(values), 4) if values else None
+            entry[f"{state}_last_s"] = values[-1] if values else None
+    return report
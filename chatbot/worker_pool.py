@@ -0,0 +1,258 @@
+"""
+Run CPU-heavy analysis in separate worker processes.
+
+Agent-generated pandas code (allow_dangerous_code=True) and chart rendering
+run in a fresh child process per task, outside the Streamlit script thread
+and its GIL. Each task gets CPU, memory and wall-clock limits. Datasets reach
+the worker through shared memory as Arrow IPC streams when pyarrow is
+installed (pickle protocol 5 otherwise, or for frames Arrow cannot convert),
+so frames are not pushed through a pipe. Spans and counters recorded in the
+worker are sent back with the result and merged into this process's metrics.
+
+Set ANALYSIS_BACKEND=inline to run in-process instead.
+"""
+import importlib
+import os
+import pickle
+import sys
+import threading
+import types
+from contextlib import contextmanager, nullcontext
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import multiprocessing as mp
+import pandas as pd
+
+from chatbot.llm_gateway import SlotPool, in_background
+from utils.metrics import captured, inc, merge_captured, observe, span, start_capture
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import pyarrow as pa
+    ARROW_IPC_AVAILABLE = True
+except ImportError:
+    ARROW_IPC_AVAILABLE = False
+
+
+ANALYSIS_BACKEND = os.environ.get("ANALYSIS_BACKEND", "process")  # "process" or "inline"
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Background tasks (precomputed summaries) leave a worker free for questions when there is more than one
+ANALYSIS_BACKGROUND_WORKERS = int(os.environ.get("ANALYSIS_BACKGROUND_WORKERS", str(max(1, ANALYSIS_WORKERS - 1))))
+ANALYSIS_TIMEOUT = float(os.environ.get("ANALYSIS_TIMEOUT", "300"))
+ANALYSIS_MAX_CPU_SECONDS = int(os.environ.get("ANALYSIS_MAX_CPU_SECONDS", "300"))
+ANALYSIS_MAX_MEMORY_MB = int(os.environ.get("ANALYSIS_MAX_MEMORY_MB", "4096"))
+
+# Modules the fork server imports once, so each task process starts warm
+PRELOAD_MODULES = ["pandas", "chatbot.agent", "langchain_experimental.agents", "langchain_ollama"]
+
+_worker_slots = SlotPool(ANALYSIS_WORKERS, ANALYSIS_BACKGROUND_WORKERS)
+_context = None
+_context_lock = threading.Lock()
+_start_lock = threading.Lock()
+
+
+class AnalysisError(RuntimeError):
+    pass
+
+
+class AnalysisTimeoutError(AnalysisError):
+    pass
+
+
+def _get_context():
+    global _context
+    with _context_lock:
+        if _context is None:
+            if "forkserver" in mp.get_all_start_methods():
+                _context = mp.get_context("forkserver")
+                _context.set_forkserver_preload(PRELOAD_MODULES)
+            else:
+                _context = mp.get_context("spawn")
+        return _context
+
+
+@contextmanager
+def _plain_main():
+    """Hide the running script from multiprocessing while a worker starts.
+
+    Streamlit installs app.py as sys.modules["__main__"], and spawn/forkserver
+    children re-execute the parent's main script to recreate it, which would
+    run the whole app in every worker. Tasks only need importable modules.
+    """
+    with _start_lock:
+        main = sys.modules.get("__main__")
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main
+
+
+# ----------------------------
+# Frame transport
+# ----------------------------
+def _encode_frame(df: pd.DataFrame) -> Tuple[str, shared_memory.SharedMemory, int]:
+    payload = None
+    if ARROW_IPC_AVAILABLE:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+        except (pa.ArrowException, ValueError, TypeError):
+            # Mixed-type object columns (Excel numbers and text, MongoDB ObjectIds)
+            # and duplicate column names, which from_pandas rejects with ValueError
+            table = None
+        if table is not None:
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            payload, fmt = sink.getvalue(), "arrow"
+    if payload is None:
+        payload, fmt = pickle.dumps(df, protocol=5), "pickle"
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(payload)))
+    shm.buf[:len(payload)] = memoryview(payload).cast("B")
+    return fmt, shm, len(payload)
+
+
+def _decode_frame(fmt: str, name: str, size: int) -> pd.DataFrame:
+    # Workers share the parent's resource tracker, which unlinks the segment
+    # if the parent dies; the parent unlinks it after the task otherwise
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        data = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+    if fmt == "arrow":
+        return pa.ipc.open_stream(pa.py_buffer(data)).read_all().to_pandas()
+    return pickle.loads(data)
+
+
+# ----------------------------
+# Worker process
+# ----------------------------
+def _apply_limits(cpu_seconds: int, memory_mb: int):
+    if resource is None:
+        return
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _record_peak_rss():
+    # Workers are forkserver grandchildren, invisible to the app's RUSAGE_CHILDREN
+    if resource is None:
+        return
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    observe("aivengers_worker_peak_rss_mb", peak / (1024 * 1024 if sys.platform == "darwin" else 1024),
+            help="Peak resident memory of each analysis worker")
+
+
+def _worker_main(conn, target: str, handles: Dict[str, Tuple[str, str, int]], kwargs: Dict[str, Any],
+                 cpu_seconds: int, memory_mb: int):
+    start_capture()
+    try:
+        _apply_limits(cpu_seconds, memory_mb)
+        frames = {key: _decode_frame(*handle) for key, handle in handles.items()}
+        module_name, func_name = target.split(":")
+        func = getattr(importlib.import_module(module_name), func_name)
+        result = func(frames, **kwargs)
+        _record_peak_rss()
+        conn.send(("ok", result, captured()))
+    except BaseException as e:
+        _record_peak_rss()
+        conn.send(("error", f"{type(e).__name__}: {e}", captured()))
+    finally:
+        conn.close()
+
+
+def run_task(target: str, frames: Dict[str, pd.DataFrame], timeout: float = ANALYSIS_TIMEOUT,
+             cpu_seconds: int = ANALYSIS_MAX_CPU_SECONDS, memory_mb: int = ANALYSIS_MAX_MEMORY_MB,
+             hold=None, **kwargs) -> Any:
+    """Run `target` ("module:function", called as function(frames, **kwargs)) in a worker process.
+
+    `hold` is an optional context manager entered only once a worker slot is
+    free and kept for the task's duration.
+    """
+    segments: List[shared_memory.SharedMemory] = []
+    background = in_background()
+    with span("worker_slot_wait"):
+        acquired = _worker_slots.acquire(timeout, background=background)
+    if not acquired:
+        inc("aivengers_worker_rejected_total", help="Analysis tasks rejected for lack of a worker")
+        raise AnalysisTimeoutError("All analysis workers are busy, please try again")
+    try:
+        with hold or nullcontext(), span("worker_task", target=target):
+            handles = {}
+            with span("worker_encode"):
+                for key, df in frames.items():
+                    fmt, shm, size = _encode_frame(df)
+                    segments.append(shm)
+                    handles[key] = (fmt, shm.name, size)
+
+            ctx = _get_context()
+            parent_conn, child_conn = ctx.Pipe(duplex=False)
+            process = ctx.Process(
+                target=_worker_main,
+                args=(child_conn, target, handles, kwargs, cpu_seconds, memory_mb),
+                daemon=True,
+            )
+            with _plain_main():
+                process.start()
+            child_conn.close()
+            try:
+                if not parent_conn.poll(timeout):
+                    inc("aivengers_worker_timeouts_total", help="Analysis tasks killed after the time limit")
+                    raise AnalysisTimeoutError(f"Analysis took longer than {timeout:.0f}s and was stopped")
+                try:
+                    result = parent_conn.recv()
+                except EOFError:
+                    process.join(5)
+                    raise AnalysisError(f"Analysis worker exited unexpectedly (exit code {process.exitcode}); "
+                                        "it may have hit the CPU or memory limit")
+            finally:
+                if process.is_alive():
+                    process.kill()
+                process.join(5)
+                parent_conn.close()
+
+            status, value, metrics = result
+            merge_captured(metrics)
+            if status == "error":
+                raise AnalysisError(value)
+            return value
+    finally:
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+        _worker_slots.release(background)
+
+
+# ----------------------------
+# Tasks
+# ----------------------------
+def agent_task(frames: Dict[str, pd.DataFrame], sheets: List[Tuple[str, list]], question: str,
+               user: Optional[str], route: str, profiles: Optional[dict]):
+    from chatbot.agent import create_agent_for_dataframe_sheets
+    sheets_dfs = [(name, frames[str(i)], suggestions) for i, (name, suggestions) in enumerate(sheets)]
+    return create_agent_for_dataframe_sheets(sheets_dfs, question, user=user, route=route, profiles=profiles)
+
+
+def answer_question(sheets_dfs: list, question: str, user: Optional[str] = None,
+                    route: str = "analysis", profiles: Optional[dict] = None):
+    """Answer `question` over (name, df, suggestions) tuples with the configured backend."""
+    if ANALYSIS_BACKEND == "inline":
+        from chatbot.agent import create_agent_for_dataframe_sheets
+        return create_agent_for_dataframe_sheets(sheets_dfs, question, user=user, route=route, profiles=profiles)
+
+    # The worker has its own LLM gateway, so hold this process's slot on its
+    # behalf, but only after a worker is free so queued tasks don't block chat
+    from chatbot.llm_gateway import llm_slot
+    frames = {str(i): df for i, (_, df, _) in enumerate(sheets_dfs)}
+    sheets = [(name, suggestions) for name, _, suggestions in sheets_dfs]
+    return run_task("chatbot.worker_pool:agent_task", frames, hold=llm_slot(user), sheets=sheets,
+                    question=question, user=user, route=route, profiles=profiles)
@@ -1,5 +1,6 @@
 import pandas as pd
 from typing import Dict
+from utils.metrics import span, timed
 
 def load_file_data(uploaded_file):
     """
@@ -8,51 +9,63 @@ def load_file_data(uploaded_file):
     Returns a dict of {sheet_name: dataframe} to maintain consistency.
     """
     if uploaded_file.name.endswith(".csv"):
-        df = pd.read_csv(uploaded_file)
+        with span("file_parse", format="csv"):
+            df = pd.read_csv(uploaded_file)
         return {"Sheet1": df}
 
     elif uploaded_file.name.endswith(".xlsx"):
-        xls = pd.ExcelFile(uploaded_file)
-        return {sheet: xls.parse(sheet) for sheet in xls.sheet_names}
+        with span("file_parse", format="xlsx"):
+            xls = pd.ExcelFile(uploaded_file)
+            return {sheet: xls.parse(sheet) for sheet in xls.sheet_names}
 
     else:
         raise ValueError("Unsupported file format. Please upload .csv or .xlsx.")
 
 
 
+import numpy as np
 import pandas as pd
+from typing import Optional
+from data.profile import DatasetProfile
 
-def suggest_questions(df: pd.DataFrame, max_suggestions: int = 3) -> list:
+@timed("profiling")
+def suggest_questions(df: pd.DataFrame, max_suggestions: int = 3, profile: Optional[DatasetProfile] = None) -> list:
     suggestions = []
+    # Column statistics come from the (possibly incrementally updated) profile
+    profile = profile or DatasetProfile.from_frame(df)
 
     # Drop columns with too many missing values
-    df = df.dropna(axis=1, thresh=len(df) * 0.7)
+    kept = {name: stats for name, stats in profile.columns.items()
+            if profile.row_count - stats.nulls >= profile.row_count * 0.7}
 
     # Detect types
-    numeric_cols = df.select_dtypes(include=["number"]).columns.tolist()
-    categorical_cols = df.select_dtypes(include=["object", "category"]).columns.tolist()
-    datetime_cols = df.select_dtypes(include=["datetime64"]).columns.tolist()
+    numeric_cols = [name for name, stats in kept.items() if stats.kind == "numeric"]
+    categorical_cols = [name for name, stats in kept.items() if stats.kind == "categorical"]
+    datetime_cols = [name for name, stats in kept.items() if stats.kind == "datetime"]
 
     # Rank numeric by variance
     if numeric_cols:
-        numeric_variance = df[numeric_cols].var().sort_values(ascending=False)
-        top_numeric = numeric_variance.index.tolist()
+        numeric_variance = pd.Series({name: kept[name].variance for name in numeric_cols}, dtype=float)
+        top_numeric = numeric_variance.sort_values(ascending=False).index.tolist()
     else:
         top_numeric = []
 
     # Rank categorical by number of unique values (but not too many)
     if categorical_cols:
-        cat_unique_counts = df[categorical_cols].nunique()
+        cat_unique_counts = pd.Series({name: kept[name].distinct for name in categorical_cols})
         top_categoricals = cat_unique_counts[(cat_unique_counts > 1) & (cat_unique_counts < 50)].sort_values().index.tolist()
     else:
         top_categoricals = []
 
     # 1. Best numeric correlation
     if len(top_numeric) >= 2:
-        corr_matrix = df[top_numeric].corr().abs()
-        corr_matrix.values[[range(len(corr_matrix))]*2] = 0  # remove diagonal
-        max_corr = corr_matrix.stack().idxmax()
-        suggestions.append(f"How does '{max_corr[0]}' relate to '{max_corr[1]}'?")
+        corr = profile.correlation.correlation().loc[top_numeric, top_numeric].abs()
+        values = corr.to_numpy(copy=True)
+        np.fill_diagonal(values, 0)  # remove diagonal
+        corr_matrix = pd.DataFrame(values, index=corr.index, columns=corr.columns)
+        if corr_matrix.notna().any().any():
+            max_corr = corr_matrix.stack().idxmax()
+            suggestions.append(f"How does '{max_corr[0]}' relate to '{max_corr[1]}'?")
 
     # 2. Best numeric + category combo
     if top_numeric and top_categoricals:
@@ -0,0 +1,185 @@
+"""
+Memory-compact DataFrames and a shared, content-addressed frame store.
+
+Frames are compacted once after ingestion/fetch (categoricals for
+low-cardinality strings, Arrow-backed strings when pyarrow is installed) and
+kept in a process-wide store keyed by content, so several
+sessions loading the same dataset share one copy.
+"""
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from utils.metrics import span
+
+try:
+    import pyarrow  # noqa: F401
+    ARROW_STRINGS_AVAILABLE = True
+except ImportError:
+    ARROW_STRINGS_AVAILABLE = False
+
+
+FRAME_STORE_MAX_MB = float(os.environ.get("FRAME_STORE_MAX_MB", "1024"))
+CATEGORY_MAX_RATIO = 0.5  # convert to category when unique values / rows is below this
+CATEGORY_MAX_UNIQUE = 10_000
+
+
+def memory_usage_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def _compact_strings(col: pd.Series) -> pd.Series:
+    inferred = pd.api.types.infer_dtype(col, skipna=True)
+    if inferred not in ("string", "empty"):
+        return col  # mixed objects (dicts, bytes, ...) are left alone
+    n_unique = col.nunique(dropna=True)
+    if len(col) and n_unique <= CATEGORY_MAX_UNIQUE and n_unique / len(col) < CATEGORY_MAX_RATIO:
+        return col.astype("category")
+    if ARROW_STRINGS_AVAILABLE and pd.api.types.is_object_dtype(col.dtype):
+        return col.astype("string[pyarrow]")
+    return col
+
+
+def compact_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """Return a memory-compact copy of `df` with the same values.
+
+    Numeric columns keep their dtype: the agent runs arbitrary arithmetic on
+    these frames, and narrower ints overflow (a * b) while float32 loses
+    precision in sums.
+    """
+    with span("frame_compact"):
+        columns = {}
+        for position in range(df.shape[1]):
+            col = df.iloc[:, position]
+            if pd.api.types.is_object_dtype(col.dtype) or isinstance(col.dtype, pd.StringDtype):
+                col = _compact_strings(col)
+            columns[position] = col
+        compact = pd.DataFrame(columns, index=df.index)
+        compact.columns = df.columns
+        return compact
+
+
+def analysis_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """`df` with categorical columns converted back to their category dtype.
+
+    Stored frames keep categoricals to save memory, but agent-generated code
+    expects plain columns: assigning a new value to a categorical raises, and
+    value_counts() lists unused categories with a count of 0.
+    """
+    categorical = [position for position in range(df.shape[1])
+                   if isinstance(df.iloc[:, position].dtype, pd.CategoricalDtype)]
+    if not categorical:
+        return df
+    columns = {}
+    for position in range(df.shape[1]):
+        col = df.iloc[:, position]
+        columns[position] = col.astype(col.cat.categories.dtype) if position in categorical else col
+    plain = pd.DataFrame(columns, index=df.index)
+    plain.columns = df.columns
+    return plain
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of a frame's values, column names and row index."""
+    digest = hashlib.sha1()
+    digest.update(repr(list(df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def content_key(data: bytes, *parts: str) -> str:
+    """Key for raw content such as an uploaded file's bytes."""
+    digest = hashlib.sha1(data)
+    for part in parts:
+        digest.update(part.encode())
+    return digest.hexdigest()
+
+
+def sheet_key(file_key: str, sheet: str) -> str:
+    """Store key of one sheet of an uploaded file."""
+    return f"{file_key}:{sheet}"
+
+
+class FrameStore:
+    """Thread-safe LRU of compacted frames, bounded by total memory."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._frames: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._sheets: Dict[str, list] = {}
+        self._lock = threading.RLock()
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        with self._lock:
+            df = self._frames.get(key)
+            if df is not None:
+                self._frames.move_to_end(key)
+            return df
+
+    def put(self, df: pd.DataFrame, key: Optional[str] = None, compact: bool = True) -> Tuple[str, pd.DataFrame]:
+        """Store `df` (compacted) and return its key and the shared frame."""
+        if key is None:
+            try:
+                key = frame_fingerprint(df)
+            except TypeError:
+                # Unhashable cells (e.g. nested MongoDB documents): no dedup.
+                # A fresh key, since id() values are reused once a frame is freed
+                # and caches keyed on it would serve another frame's results
+                return f"uncached:{uuid.uuid4().hex}", df
+        existing = self.get(key)
+        if existing is not None:
+            return key, existing
+        stored = compact_dataframe(df) if compact else df
+        size = memory_usage_bytes(stored)
+        with self._lock:
+            existing = self._frames.get(key)
+            if existing is not None:
+                return key, existing
+            self._frames[key] = stored
+            self._sizes[key] = size
+            self._evict()
+        return key, stored
+
+    def get_or_load_sheets(self, file_key: str, loader: Callable[[], Dict[str, pd.DataFrame]]) -> Dict[str, pd.DataFrame]:
+        """Sheets of an uploaded file, parsed and compacted only on first load."""
+        with self._lock:
+            names = self._sheets.get(file_key)
+            if names is not None:
+                sheets = {name: self.get(sheet_key(file_key, name)) for name in names}
+                if all(df is not None for df in sheets.values()):
+                    return sheets
+        sheets = {name: self.put(df, key=sheet_key(file_key, name))[1] for name, df in loader().items()}
+        with self._lock:
+            self._sheets[file_key] = list(sheets)
+        return sheets
+
+    def _evict(self):
+        while self._frames and self.total_bytes() > self.max_bytes and len(self._frames) > 1:
+            key, _ = self._frames.popitem(last=False)
+            self._sizes.pop(key, None)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+
+_store: Optional[FrameStore] = None
+_store_lock = threading.Lock()
+
+
+def get_frame_store() -> FrameStore:
+    """The process-wide store shared by every session."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FrameStore(int(FRAME_STORE_MAX_MB * 1024 * 1024))
+        return _store
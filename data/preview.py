@@ -0,0 +1,156 @@
+"""
+Bounded previews of large frames.
+
+The browser only ever receives one page of a frame: the page size is chosen
+so that rows x columns stays under PREVIEW_MAX_CELLS. Sorting and filtering
+run here, on the cached frame, and the resulting row positions are memoised
+per frame key, so paging through a sorted view does not re-sort. A
+stratified sample gives a representative view without scrolling.
+
+Fetch limits for database tables scale the same way: narrow tables fetch
+more rows for analysis than wide ones, within DB_FETCH_MIN_ROWS and
+DB_FETCH_MAX_ROWS.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+PREVIEW_MAX_CELLS = int(os.environ.get("PREVIEW_MAX_CELLS", "5000"))
+PREVIEW_MAX_COLUMNS = int(os.environ.get("PREVIEW_MAX_COLUMNS", "100"))
+PREVIEW_MIN_ROWS = 10
+PREVIEW_MAX_ROWS = 200
+ANALYSIS_MAX_CELLS = int(os.environ.get("ANALYSIS_MAX_CELLS", "1000000"))
+DB_FETCH_MIN_ROWS = int(os.environ.get("DB_FETCH_MIN_ROWS", "1000"))
+DB_FETCH_MAX_ROWS = int(os.environ.get("DB_FETCH_MAX_ROWS", "100000"))
+SAMPLE_MAX_STRATA = 20
+VIEW_CACHE_SIZE = 64
+
+_COMPARISON = re.compile(r"^\s*(<=|>=|==|!=|<|>|=)?\s*(-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)\s*$")
+
+_views: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+_views_lock = threading.Lock()
+
+
+def page_rows(n_columns: int) -> int:
+    """Rows per page so that one page stays within PREVIEW_MAX_CELLS."""
+    rows = PREVIEW_MAX_CELLS // max(1, min(n_columns, PREVIEW_MAX_COLUMNS))
+    return max(PREVIEW_MIN_ROWS, min(PREVIEW_MAX_ROWS, rows))
+
+
+def adaptive_fetch_limit(n_columns: Optional[int]) -> int:
+    """Rows to fetch for analysis from a table with `n_columns` columns."""
+    if not n_columns:
+        return DB_FETCH_MIN_ROWS
+    return max(DB_FETCH_MIN_ROWS, min(DB_FETCH_MAX_ROWS, ANALYSIS_MAX_CELLS // n_columns))
+
+
+def _cached(cache_key: Tuple, compute: Callable[[], np.ndarray]) -> np.ndarray:
+    with _views_lock:
+        positions = _views.get(cache_key)
+        if positions is not None:
+            _views.move_to_end(cache_key)
+            return positions
+    positions = compute()
+    with _views_lock:
+        _views[cache_key] = positions
+        while len(_views) > VIEW_CACHE_SIZE:
+            _views.popitem(last=False)
+    return positions
+
+
+def _match(col: pd.Series, text: str) -> np.ndarray:
+    """Rows of `col` matching `text`: a comparison such as ">= 10" for numbers, else a substring."""
+    comparison = _COMPARISON.match(text)
+    if comparison and pd.api.types.is_numeric_dtype(col.dtype) and not pd.api.types.is_bool_dtype(col.dtype):
+        op, value = comparison.group(1) or "=", float(comparison.group(2))
+        values = col.to_numpy(dtype=np.float64, na_value=np.nan)
+        with np.errstate(invalid="ignore"):
+            return {
+                "<": values < value, "<=": values <= value, ">": values > value, ">=": values >= value,
+                "=": values == value, "==": values == value, "!=": values != value,
+            }[op]
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        # Match each category once, then expand by code
+        hits = col.cat.categories.astype(str).str.contains(text, case=False, regex=False)
+        codes = col.cat.codes.to_numpy()
+        return np.where(codes >= 0, np.asarray(hits)[codes], False)
+    return col.astype(str).str.contains(text, case=False, regex=False).fillna(False).to_numpy(dtype=bool)
+
+
+def view_positions(df: pd.DataFrame, key: str, sort_by: Optional[str] = None, ascending: bool = True,
+                   filter_column: Optional[str] = None, filter_text: str = "") -> np.ndarray:
+    """Row positions of `df` after filtering and sorting, memoised per frame key."""
+    filter_text = filter_text.strip()
+
+    def compute() -> np.ndarray:
+        positions = np.arange(len(df))
+        if filter_column is not None and filter_text:
+            positions = positions[_match(df[filter_column], filter_text)]
+        if sort_by is not None:
+            column = df[sort_by].iloc[positions].reset_index(drop=True)
+            try:
+                order = column.sort_values(ascending=ascending, kind="stable", na_position="last").index
+            except TypeError:
+                # Mixed types (numbers and text in one Excel column): sort by their text
+                column = column.astype(str).where(column.notna())
+                order = column.sort_values(ascending=ascending, kind="stable", na_position="last").index
+            positions = positions[order.to_numpy()]
+        return positions
+
+    if sort_by is None and not (filter_column is not None and filter_text):
+        return np.arange(len(df))
+    return _cached(("view", key, sort_by, ascending, filter_column, filter_text), compute)
+
+
+def page_frame(df: pd.DataFrame, positions: np.ndarray, page: int, rows: int) -> pd.DataFrame:
+    """One page (0-based) of the view, limited to PREVIEW_MAX_COLUMNS columns."""
+    chunk = positions[page * rows:(page + 1) * rows]
+    return df.iloc[chunk, :PREVIEW_MAX_COLUMNS]
+
+
+def _strata(col: pd.Series) -> np.ndarray:
+    """Stratum code per row, with missing values as a stratum of their own."""
+    try:
+        return pd.factorize(col, use_na_sentinel=False)[0]
+    except TypeError:  # unhashable cells
+        return pd.factorize(col.astype(str), use_na_sentinel=False)[0]
+
+
+def stratify_column(df: pd.DataFrame) -> Optional[str]:
+    """The categorical column with the most distinct values, up to SAMPLE_MAX_STRATA."""
+    best, best_distinct = None, 1
+    for name in df.columns:
+        col = df[name]
+        if pd.api.types.is_numeric_dtype(col.dtype) or pd.api.types.is_datetime64_any_dtype(col.dtype):
+            continue
+        try:
+            distinct = col.nunique()
+        except TypeError:  # unhashable cells
+            continue
+        if best_distinct < distinct <= SAMPLE_MAX_STRATA:
+            best, best_distinct = name, distinct
+    return best
+
+
+def stratified_sample(df: pd.DataFrame, n: int, key: str, by: Optional[str] = None, seed: int = 0) -> pd.DataFrame:
+    """About `n` rows, proportional per stratum of `by` with at least one row each, in original order."""
+    if len(df) <= n:
+        return df.iloc[:, :PREVIEW_MAX_COLUMNS]
+
+    def compute() -> np.ndarray:
+        rows = pd.Series(np.arange(len(df)))
+        if by is None:
+            return np.sort(rows.sample(n, random_state=seed).to_numpy())
+        groups = rows.groupby(_strata(df[by]), sort=False)
+        # One row per stratum is reserved; the rest is allocated proportionally
+        firsts = groups.head(1).to_numpy()
+        frac = max(0, n - len(firsts)) / len(df)
+        return np.union1d(groups.sample(frac=frac, random_state=seed).to_numpy(), firsts)
+
+    return df.iloc[_cached(("sample", key, n, by, seed), compute), :PREVIEW_MAX_COLUMNS]
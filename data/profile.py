@@ -0,0 +1,346 @@
+"""
+Mergeable, incremental dataset profiles.
+
+Per-column statistics (count/mean/variance via Welford, min/max, a KMV
+distinct-count sketch) and a numeric co-moment matrix for correlations can
+be updated chunk by chunk and merged. Profiles are persisted per user and
+dataset, so re-uploading a daily export that only appends rows profiles
+just the new rows.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from storage import get_user_dir
+from utils.metrics import inc, span
+
+
+KMV_SIZE = 256  # sketch size; counts below this are exact
+_HASH_SPACE = float(2 ** 64)
+
+
+def _hash_values(col: pd.Series) -> np.ndarray:
+    values = col.dropna()
+    if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+        values = values.astype(np.float64)  # downcast and original frames hash alike
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+class DistinctSketch:
+    """K-minimum-values distinct count estimator; merge by union."""
+
+    def __init__(self, k: int = KMV_SIZE, hashes: Optional[List[int]] = None):
+        self.k = k
+        self.hashes = np.array(sorted(hashes or []), dtype=np.uint64)
+
+    def update(self, hashes: np.ndarray):
+        combined = np.union1d(self.hashes, np.unique(hashes.astype(np.uint64)))
+        self.hashes = combined[:self.k]
+
+    def merge(self, other: "DistinctSketch"):
+        self.update(other.hashes)
+
+    def estimate(self) -> int:
+        if len(self.hashes) < self.k:
+            return int(len(self.hashes))
+        return int(round((self.k - 1) / (float(self.hashes[-1]) / _HASH_SPACE)))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"k": self.k, "hashes": [int(h) for h in self.hashes]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DistinctSketch":
+        return cls(data["k"], data["hashes"])
+
+
+class ColumnStats:
+    """Streaming stats for one column. Numeric moments use Welford / Chan's parallel update."""
+
+    def __init__(self, kind: str):
+        self.kind = kind  # "numeric", "datetime" or "categorical"
+        self.count = 0
+        self.nulls = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.sketch = DistinctSketch()
+
+    @staticmethod
+    def kind_of(col: pd.Series) -> str:
+        if pd.api.types.is_bool_dtype(col.dtype):
+            return "categorical"
+        if pd.api.types.is_numeric_dtype(col.dtype):
+            return "numeric"
+        if pd.api.types.is_datetime64_any_dtype(col.dtype):
+            return "datetime"
+        return "categorical"
+
+    def update(self, col: pd.Series):
+        self.nulls += int(col.isna().sum())
+        self.sketch.update(_hash_values(col))
+        values = col.dropna()
+        if values.empty:
+            return
+        if self.kind == "datetime":
+            values = values.astype("int64")
+        if self.kind in ("numeric", "datetime"):
+            arr = values.to_numpy(dtype=np.float64)
+            self._merge_moments(len(arr), float(arr.mean()), float(((arr - arr.mean()) ** 2).sum()))
+            low, high = float(arr.min()), float(arr.max())
+            self.min = low if self.min is None else min(self.min, low)
+            self.max = high if self.max is None else max(self.max, high)
+        else:
+            self.count += len(values)
+
+    def _merge_moments(self, n: int, mean: float, m2: float):
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+    def merge(self, other: "ColumnStats"):
+        self.nulls += other.nulls
+        self.sketch.merge(other.sketch)
+        if self.kind in ("numeric", "datetime") and other.count:
+            self._merge_moments(other.count, other.mean, other.m2)
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        elif self.kind == "categorical":
+            self.count += other.count
+
+    @property
+    def variance(self) -> Optional[float]:
+        return self.m2 / (self.count - 1) if self.count > 1 else None
+
+    @property
+    def distinct(self) -> int:
+        return min(self.sketch.estimate(), self.count)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "count": self.count, "nulls": self.nulls, "mean": self.mean,
+                "m2": self.m2, "min": self.min, "max": self.max, "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ColumnStats":
+        stats = cls(data["kind"])
+        stats.count, stats.nulls = data["count"], data["nulls"]
+        stats.mean, stats.m2 = data["mean"], data["m2"]
+        stats.min, stats.max = data["min"], data["max"]
+        stats.sketch = DistinctSketch.from_dict(data["sketch"])
+        return stats
+
+
+class CorrelationAccumulator:
+    """Co-moment matrix over rows where every tracked numeric column is present."""
+
+    def __init__(self, columns: List[str]):
+        self.columns = list(columns)
+        size = len(self.columns)
+        self.n = 0
+        self.mean = np.zeros(size)
+        self.comoment = np.zeros((size, size))
+
+    def update(self, df: pd.DataFrame):
+        if not self.columns:
+            return
+        block = df[self.columns].dropna().to_numpy(dtype=np.float64)
+        if not len(block):
+            return
+        mean = block.mean(axis=0)
+        centered = block - mean
+        self._merge(len(block), mean, centered.T @ centered)
+
+    def _merge(self, n: int, mean: np.ndarray, comoment: np.ndarray):
+        total = self.n + n
+        delta = mean - self.mean
+        self.comoment = self.comoment + comoment + np.outer(delta, delta) * self.n * n / total
+        self.mean = self.mean + delta * n / total
+        self.n = total
+
+    def merge(self, other: "CorrelationAccumulator"):
+        if other.n:
+            self._merge(other.n, other.mean, other.comoment)
+
+    def correlation(self) -> pd.DataFrame:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(np.diag(self.comoment))
+            corr = self.comoment / np.outer(std, std)
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"columns": self.columns, "n": self.n, "mean": self.mean.tolist(),
+                "comoment": self.comoment.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CorrelationAccumulator":
+        acc = cls(data["columns"])
+        acc.n = data["n"]
+        acc.mean = np.array(data["mean"], dtype=np.float64).reshape(len(acc.columns))
+        acc.comoment = np.array(data["comoment"], dtype=np.float64).reshape(len(acc.columns), len(acc.columns))
+        return acc
+
+
+def column_labels(df: pd.DataFrame) -> List[str]:
+    """Profile names of `df`'s columns: str(label), with repeated labels numbered.
+
+    Join results often carry the same column name twice, where df[name]
+    would return a frame instead of a column.
+    """
+    labels, seen = [], set()
+    for column in df.columns:
+        label = candidate = str(column)
+        n = 2
+        while candidate in seen:
+            candidate, n = f"{label}_{n}", n + 1
+        seen.add(candidate)
+        labels.append(candidate)
+    return labels
+
+
+def _rows_digest(df: pd.DataFrame) -> int:
+    """Order-independent, appendable digest of row contents (sum of row hashes mod 2**64).
+
+    Numbers are hashed as float64 so the same values hash alike whatever their
+    width (e.g. int32 from one source, int64 from another).
+    """
+    if df.empty:
+        return 0
+    normalized = df.copy(deep=False)
+    for position in range(normalized.shape[1]):
+        col = normalized.iloc[:, position]
+        if pd.api.types.is_numeric_dtype(col.dtype) and not pd.api.types.is_bool_dtype(col.dtype):
+            normalized.isetitem(position, col.astype(np.float64))
+    hashes = pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+    return int(hashes.sum(dtype=np.uint64))
+
+
+class DatasetProfile:
+    def __init__(self, columns: Dict[str, ColumnStats], correlation: CorrelationAccumulator):
+        self.columns = columns
+        self.correlation = correlation
+        self.row_count = 0
+        self.digest = 0
+
+    @classmethod
+    def empty_for(cls, df: pd.DataFrame) -> "DatasetProfile":
+        columns = {name: ColumnStats(ColumnStats.kind_of(df.iloc[:, position]))
+                   for position, name in enumerate(column_labels(df))}
+        numeric = [name for name, stats in columns.items() if stats.kind == "numeric"]
+        return cls(columns, CorrelationAccumulator(numeric))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "DatasetProfile":
+        profile = cls.empty_for(df)
+        profile.update(df)
+        return profile
+
+    def update(self, chunk: pd.DataFrame):
+        """Fold new rows into the profile."""
+        # Row counts go to a counter: as a span label every chunk size would be a new series
+        inc("aivengers_profile_rows_total", len(chunk), help="Rows folded into dataset profiles")
+        with span("profile_update"):
+            chunk = chunk.set_axis(column_labels(chunk), axis=1)
+            for name, stats in self.columns.items():
+                stats.update(chunk[name])
+            self.correlation.update(chunk)
+            self.row_count += len(chunk)
+            self.digest = (self.digest + _rows_digest(chunk)) % 2 ** 64
+
+    def merge(self, other: "DatasetProfile"):
+        for name, stats in self.columns.items():
+            stats.merge(other.columns[name])
+        self.correlation.merge(other.correlation)
+        self.row_count += other.row_count
+        self.digest = (self.digest + other.digest) % 2 ** 64
+
+    def same_schema(self, df: pd.DataFrame) -> bool:
+        return list(self.columns) == column_labels(df) and all(
+            stats.kind == ColumnStats.kind_of(df.iloc[:, position])
+            for position, stats in enumerate(self.columns.values()))
+
+    def numeric_columns(self) -> List[str]:
+        return [name for name, stats in self.columns.items() if stats.kind == "numeric"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "row_count": self.row_count,
+            "digest": str(self.digest),
+            "columns": {name: stats.to_dict() for name, stats in self.columns.items()},
+            "correlation": self.correlation.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DatasetProfile":
+        profile = cls(
+            {name: ColumnStats.from_dict(stats) for name, stats in data["columns"].items()},
+            CorrelationAccumulator.from_dict(data["correlation"]),
+        )
+        profile.row_count = data["row_count"]
+        profile.digest = int(data["digest"])
+        return profile
+
+
+def _profile_path(username: str, dataset_key: str) -> str:
+    profile_dir = os.path.join(get_user_dir(username), "profiles")
+    os.makedirs(profile_dir, exist_ok=True)
+    return os.path.join(profile_dir, hashlib.sha1(dataset_key.encode()).hexdigest() + ".json")
+
+
+def load_profile(username: str, dataset_key: str) -> Optional[DatasetProfile]:
+    path = _profile_path(username, dataset_key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return DatasetProfile.from_dict(json.load(f))
+    except (ValueError, KeyError):
+        return None  # corrupt or from an older format: rebuild
+
+
+def save_profile(username: str, dataset_key: str, profile: DatasetProfile):
+    with span("storage_write"):
+        with open(_profile_path(username, dataset_key), "w") as f:
+            json.dump(profile.to_dict(), f)
+
+
+def extend_profile(profile: Optional[DatasetProfile], df: pd.DataFrame) -> bool:
+    """Bring `profile` up to date with `df` if `df` only appends rows to what it covers.
+
+    Returns False, leaving `profile` untouched, when it cannot be reused.
+    """
+    if profile is None or not profile.same_schema(df) or profile.row_count > len(df):
+        return False
+    if _rows_digest(df.iloc[:profile.row_count]) != profile.digest:
+        return False
+    if profile.row_count < len(df):
+        profile.update(df.iloc[profile.row_count:])
+    return True
+
+
+def profile_dataset(df: pd.DataFrame, username: Optional[str] = None, dataset_key: Optional[str] = None) -> DatasetProfile:
+    """Profile `df`, reusing the persisted profile when rows were only appended.
+
+    `dataset_key` identifies the dataset across uploads (e.g. file and sheet
+    name). If the stored profile's rows match the first rows of `df`, only the
+    remaining rows are processed; otherwise the profile is rebuilt.
+    """
+    if not username or not dataset_key:
+        return DatasetProfile.from_frame(df)
+
+    profile = load_profile(username, dataset_key)
+    if profile is not None:
+        covered = profile.row_count
+        if extend_profile(profile, df):
+            if covered < len(df):
+                save_profile(username, dataset_key, profile)
+            return profile
+
+    profile = DatasetProfile.from_frame(df)
+    save_profile(username, dataset_key, profile)
+    return profile
@@ -1,28 +1,55 @@
-import pymysql
+import importlib
+import importlib.util
+import os
 import pandas as pd
 import streamlit as st
 from typing import Optional, List, Dict, Any
 import traceback
+from utils.metrics import span
 
-try:
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
-    PSYCOPG2_AVAILABLE = True
-except ImportError:
-    PSYCOPG2_AVAILABLE = False
-    st.warning("PostgreSQL support not available. Install psycopg2-binary for PostgreSQL connectivity.")
 
-try:
-    import pymongo
-    PYMONGO_AVAILABLE = True
-except ImportError:
-    PYMONGO_AVAILABLE = False
+# Database drivers are imported the first time that database type is used,
+# so users who only upload files never pay for pymysql/psycopg2/pymongo.
+# db_type -> (modules to import, pip package to suggest when missing)
+DRIVER_REGISTRY = {
+    'mysql': (['pymysql', 'pymysql.cursors'], 'pymysql'),
+    'postgresql': (['psycopg2', 'psycopg2.extras'], 'psycopg2-binary'),
+    'mongodb': (['pymongo'], 'pymongo'),
+    'sqlite': (['sqlite3'], None),
+}
 
-try:
-    import sqlite3
-    SQLITE_AVAILABLE = True
-except ImportError:
-    SQLITE_AVAILABLE = False
+_loaded_drivers: Dict[str, Any] = {}
+
+# Memory-map SQLite files so repeated scans read from the page cache
+SQLITE_MMAP_MB = int(os.environ.get("SQLITE_MMAP_MB", "256"))
+
+
+class DriverNotAvailableError(ImportError):
+    pass
+
+
+def driver_available(db_type: str) -> bool:
+    """Check whether a driver is installed without importing it."""
+    modules, _ = DRIVER_REGISTRY.get(db_type, ([None], None))
+    return modules[0] is not None and importlib.util.find_spec(modules[0]) is not None
+
+
+def load_driver(db_type: str):
+    """Import and cache the driver module for a database type."""
+    driver = _loaded_drivers.get(db_type)
+    if driver is not None:
+        return driver
+    if db_type not in DRIVER_REGISTRY:
+        raise DriverNotAvailableError(f"Unsupported database type: {db_type}")
+    modules, package = DRIVER_REGISTRY[db_type]
+    try:
+        with span("db_driver_import", db_type=db_type):
+            for module in modules:
+                importlib.import_module(module)
+    except ImportError:
+        raise DriverNotAvailableError(f"{db_type} driver not available. Install {package}.")
+    driver = _loaded_drivers[db_type] = importlib.import_module(modules[0])
+    return driver
 
 
 class DatabaseConnector:
@@ -38,20 +65,25 @@ class DatabaseConnector:
     def test_connection(self) -> Dict[str, Any]:
         """Test database connection and return status"""
         try:
-            if self.db_type == 'mysql':
-                return self._test_mysql_connection()
-            elif self.db_type == 'postgresql':
-                return self._test_postgresql_connection()
-            elif self.db_type == 'mongodb':
-                return self._test_mongodb_connection()
-            elif self.db_type == 'sqlite':
-                return self._test_sqlite_connection()
-            else:
-                return {"success": False, "error": f"Unsupported database type: {self.db_type}"}
+            with span("db_connect", db_type=self.db_type):
+                return self._test_connection()
         except Exception as e:
             return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
 
+    def _test_connection(self) -> Dict[str, Any]:
+        if self.db_type == 'mysql':
+            return self._test_mysql_connection()
+        elif self.db_type == 'postgresql':
+            return self._test_postgresql_connection()
+        elif self.db_type == 'mongodb':
+            return self._test_mongodb_connection()
+        elif self.db_type == 'sqlite':
+            return self._test_sqlite_connection()
+        else:
+            return {"success": False, "error": f"Unsupported database type: {self.db_type}"}
+
     def _test_mysql_connection(self) -> Dict[str, Any]:
+        pymysql = load_driver('mysql')
         try:
             conn = pymysql.connect(
                 host=self.host,
@@ -72,9 +104,10 @@ class DatabaseConnector:
             return {"success": False, "error": str(e)}
 
     def _test_postgresql_connection(self) -> Dict[str, Any]:
-        if not PSYCOPG2_AVAILABLE:
+        if not driver_available('postgresql'):
             return {"success": False, "error": "PostgreSQL driver not available. Install psycopg2-binary."}
-        
+        psycopg2 = load_driver('postgresql')
+
         try:
             conn = psycopg2.connect(
                 host=self.host,
@@ -82,7 +115,7 @@ class DatabaseConnector:
                 user=self.username,
                 password=self.password,
                 database=self.database,
-                cursor_factory=RealDictCursor,
+                cursor_factory=psycopg2.extras.RealDictCursor,
                 connect_timeout=10
             )
             cursor = conn.cursor()
@@ -95,9 +128,10 @@ class DatabaseConnector:
             return {"success": False, "error": str(e)}
 
     def _test_mongodb_connection(self) -> Dict[str, Any]:
-        if not PYMONGO_AVAILABLE:
+        if not driver_available('mongodb'):
             return {"success": False, "error": "MongoDB driver not available. Install pymongo."}
-        
+        pymongo = load_driver('mongodb')
+
         try:
             client = pymongo.MongoClient(
                 host=self.host,
@@ -113,7 +147,7 @@ class DatabaseConnector:
 
     def _test_sqlite_connection(self) -> Dict[str, Any]:
         try:
-            conn = sqlite3.connect(self.host)  # For SQLite, host is the file path
+            conn = self._connect_sqlite()
             conn.execute("SELECT sqlite_version()")
             conn.close()
             return {"success": True, "message": "Connected to SQLite", "type": "sqlite"}
@@ -138,6 +172,7 @@ class DatabaseConnector:
             return []
 
     def _get_mysql_databases(self) -> List[str]:
+        pymysql = load_driver('mysql')
         conn = pymysql.connect(
             host=self.host,
             port=self.port,
@@ -153,13 +188,14 @@ class DatabaseConnector:
         return dbs
 
     def _get_postgresql_databases(self) -> List[str]:
+        psycopg2 = load_driver('postgresql')
         conn = psycopg2.connect(
             host=self.host,
             port=self.port,
             user=self.username,
             password=self.password,
             database='postgres',  # Connect to default database
-            cursor_factory=RealDictCursor
+            cursor_factory=psycopg2.extras.RealDictCursor
         )
         cursor = conn.cursor()
         cursor.execute("SELECT datname FROM pg_database WHERE datistemplate = false")
@@ -169,6 +205,7 @@ class DatabaseConnector:
         return dbs
 
     def _get_mongodb_databases(self) -> List[str]:
+        pymongo = load_driver('mongodb')
         client = pymongo.MongoClient(
             host=self.host,
             port=self.port,
@@ -195,6 +232,7 @@ class DatabaseConnector:
             return []
 
     def _get_mysql_tables(self, database: str) -> List[str]:
+        pymysql = load_driver('mysql')
         conn = pymysql.connect(
             host=self.host,
             port=self.port,
@@ -211,13 +249,14 @@ class DatabaseConnector:
         return tables
 
     def _get_postgresql_tables(self, database: str) -> List[str]:
+        psycopg2 = load_driver('postgresql')
         conn = psycopg2.connect(
             host=self.host,
             port=self.port,
             user=self.username,
             password=self.password,
             database=database,
-            cursor_factory=RealDictCursor
+            cursor_factory=psycopg2.extras.RealDictCursor
         )
         cursor = conn.cursor()
         cursor.execute("SELECT tablename FROM pg_tables WHERE schemaname = 'public'")
@@ -227,6 +266,7 @@ class DatabaseConnector:
         return tables
 
     def _get_mongodb_collections(self, database: str) -> List[str]:
+        pymongo = load_driver('mongodb')
         client = pymongo.MongoClient(
             host=self.host,
             port=self.port,
@@ -236,32 +276,139 @@ class DatabaseConnector:
         db = client[database]
         return db.list_collection_names()
 
+    def _connect_sqlite(self):
+        sqlite3 = load_driver('sqlite')
+        conn = sqlite3.connect(self.host)  # For SQLite, host is the file path
+        conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+        return conn
+
     def _get_sqlite_tables(self) -> List[str]:
-        conn = sqlite3.connect(self.host)
+        conn = self._connect_sqlite()
         cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
         tables = [row[0] for row in cursor.fetchall()]
         conn.close()
         return tables
 
+    def get_table_relationships(self, database: str = None, tables: List[str] = None) -> List[Dict[str, str]]:
+        """Get foreign keys between tables as {table, key, related_table, related_key}"""
+        try:
+            with span("db_relationships", db_type=self.db_type):
+                if self.db_type == 'mysql':
+                    rels = self._get_mysql_relationships(database)
+                elif self.db_type == 'postgresql':
+                    rels = self._get_postgresql_relationships(database)
+                elif self.db_type == 'sqlite':
+                    rels = self._get_sqlite_relationships(tables)
+                else:
+                    return []  # MongoDB has no foreign keys
+        except Exception as e:
+            st.error(f"Error getting table relationships: {str(e)}")
+            return []
+        if tables:
+            rels = [r for r in rels if r["table"] in tables and r["related_table"] in tables]
+        return rels
+
+    def _get_mysql_relationships(self, database: str) -> List[Dict[str, str]]:
+        pymysql = load_driver('mysql')
+        conn = pymysql.connect(
+            host=self.host,
+            port=self.port,
+            user=self.username,
+            password=self.password,
+            database=database,
+            cursorclass=pymysql.cursors.DictCursor
+        )
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+            FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA = %s
+              AND REFERENCED_TABLE_NAME IS NOT NULL
+        """, [database])
+        rels = [
+            {"table": r["TABLE_NAME"], "key": r["COLUMN_NAME"],
+             "related_table": r["REFERENCED_TABLE_NAME"], "related_key": r["REFERENCED_COLUMN_NAME"]}
+            for r in cursor.fetchall()
+        ]
+        cursor.close()
+        conn.close()
+        return rels
+
+    def _get_postgresql_relationships(self, database: str) -> List[Dict[str, str]]:
+        psycopg2 = load_driver('postgresql')
+        conn = psycopg2.connect(
+            host=self.host,
+            port=self.port,
+            user=self.username,
+            password=self.password,
+            database=database,
+            cursor_factory=psycopg2.extras.RealDictCursor
+        )
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT kcu.table_name, kcu.column_name,
+                   ccu.table_name AS related_table, ccu.column_name AS related_column
+            FROM information_schema.table_constraints tc
+            JOIN information_schema.key_column_usage kcu
+              ON tc.constraint_name = kcu.constraint_name AND tc.table_schema = kcu.table_schema
+            JOIN information_schema.constraint_column_usage ccu
+              ON tc.constraint_name = ccu.constraint_name AND tc.table_schema = ccu.table_schema
+            WHERE tc.constraint_type = 'FOREIGN KEY' AND tc.table_schema = 'public'
+        """)
+        rels = [
+            {"table": r["table_name"], "key": r["column_name"],
+             "related_table": r["related_table"], "related_key": r["related_column"]}
+            for r in cursor.fetchall()
+        ]
+        cursor.close()
+        conn.close()
+        return rels
+
+    def _get_sqlite_relationships(self, tables: List[str] = None) -> List[Dict[str, str]]:
+        tables = tables or self._get_sqlite_tables()
+        conn = self._connect_sqlite()
+        rels = []
+        for table in tables:
+            quoted = table.replace('"', '""')
+            for row in conn.execute(f'PRAGMA foreign_key_list("{quoted}")').fetchall():
+                # (id, seq, table, from, to, on_update, on_delete, match)
+                related_table, key, related_key = row[2], row[3], row[4]
+                if related_key is None:
+                    # REFERENCES without a column targets the primary key
+                    related_quoted = related_table.replace('"', '""')
+                    pk = [c[1] for c in conn.execute(f'PRAGMA table_info("{related_quoted}")') if c[5]]
+                    related_key = pk[0] if pk else key
+                rels.append({"table": table, "key": key, "related_table": related_table, "related_key": related_key})
+        conn.close()
+        return rels
+
+    def get_column_names(self, table: str, database: str = None) -> List[str]:
+        """Column names of a table via an empty fetch; MongoDB collections have no fixed schema"""
+        if self.db_type == 'mongodb':
+            return []
+        return [str(column) for column in self.fetch_data(table, database, limit=0).columns]
+
     def fetch_data(self, table_or_query: str, database: str = None, limit: int = 1000) -> pd.DataFrame:
         """Fetch data from table or execute query"""
         try:
-            if self.db_type == 'mysql':
-                return self._fetch_mysql_data(table_or_query, database, limit)
-            elif self.db_type == 'postgresql':
-                return self._fetch_postgresql_data(table_or_query, database, limit)
-            elif self.db_type == 'mongodb':
-                return self._fetch_mongodb_data(table_or_query, database, limit)
-            elif self.db_type == 'sqlite':
-                return self._fetch_sqlite_data(table_or_query, limit)
-            else:
-                return pd.DataFrame()
+            with span("db_fetch", db_type=self.db_type):
+                if self.db_type == 'mysql':
+                    return self._fetch_mysql_data(table_or_query, database, limit)
+                elif self.db_type == 'postgresql':
+                    return self._fetch_postgresql_data(table_or_query, database, limit)
+                elif self.db_type == 'mongodb':
+                    return self._fetch_mongodb_data(table_or_query, database, limit)
+                elif self.db_type == 'sqlite':
+                    return self._fetch_sqlite_data(table_or_query, limit)
+                else:
+                    return pd.DataFrame()
         except Exception as e:
             st.error(f"Error fetching data: {str(e)}")
             return pd.DataFrame()
 
     def _fetch_mysql_data(self, table_or_query: str, database: str, limit: int) -> pd.DataFrame:
+        pymysql = load_driver('mysql')
         conn = pymysql.connect(
             host=self.host,
             port=self.port,
@@ -282,6 +429,7 @@ class DatabaseConnector:
         return df
 
     def _fetch_postgresql_data(self, table_or_query: str, database: str, limit: int) -> pd.DataFrame:
+        psycopg2 = load_driver('postgresql')
         conn = psycopg2.connect(
             host=self.host,
             port=self.port,
@@ -301,6 +449,7 @@ class DatabaseConnector:
         return df
 
     def _fetch_mongodb_data(self, collection: str, database: str, limit: int) -> pd.DataFrame:
+        pymongo = load_driver('mongodb')
         client = pymongo.MongoClient(
             host=self.host,
             port=self.port,
@@ -313,7 +462,7 @@ class DatabaseConnector:
         return pd.DataFrame(documents)
 
     def _fetch_sqlite_data(self, table_or_query: str, limit: int) -> pd.DataFrame:
-        conn = sqlite3.connect(self.host)
+        conn = self._connect_sqlite()
         
         # Check if it's a query or table name
         if any(keyword in table_or_query.upper() for keyword in ['SELECT', 'WITH']):
@@ -341,6 +490,7 @@ def fetch_data(query, database=None):
 
 
 def get_db_connection():
+    pymysql = load_driver('mysql')
     return pymysql.connect(
         host='localhost',
         user='your_user',
@@ -349,27 +499,8 @@ def get_db_connection():
         cursorclass=pymysql.cursors.DictCursor
     )
 
-def get_table_relationships(tables, database=None):
-    conn = pymysql.connect(
-        host='localhost',
-        user='your_user',
-        password='your_password',
-        database=database,
-        cursorclass=pymysql.cursors.DictCursor
-    )
-    cursor = conn.cursor()
-    format_strings = ','.join(['%s'] * len(tables))
-    query = f"""
-        SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
-        FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
-        WHERE TABLE_SCHEMA = %s
-          AND REFERENCED_TABLE_NAME IS NOT NULL
-          AND TABLE_NAME IN ({format_strings})
-          AND REFERENCED_TABLE_NAME IN ({format_strings});
-    """
-    params = [database] + tables + tables
-    cursor.execute(query, params)
-    rels = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return [{"table": r["TABLE_NAME"], "key": r["COLUMN_NAME"], "related_table": r["REFERENCED_TABLE_NAME"]} for r in rels]
+def get_table_relationships(tables, database=None, connector: Optional[DatabaseConnector] = None):
+    """Foreign keys between `tables`; requires a connector (see DatabaseConnector.get_table_relationships)"""
+    if connector is None:
+        return []
+    return connector.get_table_relationships(database, tables)
@@ -2,6 +2,42 @@ import sqlite3
 import pandas as pd
 import os
 
+# Declared up front so the orders -> customers foreign key is discoverable
+# (PRAGMA foreign_key_list); DataFrame.to_sql alone creates no constraints.
+SAMPLE_SCHEMA = """
+    DROP VIEW IF EXISTS customer_summary;
+    DROP TABLE IF EXISTS orders;
+    DROP TABLE IF EXISTS customers;
+    CREATE TABLE customers (
+        customer_id INTEGER PRIMARY KEY,
+        name TEXT,
+        email TEXT,
+        age INTEGER,
+        city TEXT
+    );
+    CREATE TABLE orders (
+        order_id INTEGER PRIMARY KEY,
+        customer_id INTEGER REFERENCES customers(customer_id),
+        product TEXT,
+        amount REAL,
+        order_date TEXT
+    );
+"""
+
+CUSTOMER_SUMMARY_VIEW = """
+    CREATE VIEW IF NOT EXISTS customer_summary AS
+    SELECT 
+        c.customer_id,
+        c.name,
+        c.city,
+        COUNT(o.order_id) as total_orders,
+        SUM(o.amount) as total_spent,
+        AVG(o.amount) as avg_order_value
+    FROM customers c
+    LEFT JOIN orders o ON c.customer_id = o.customer_id
+    GROUP BY c.customer_id, c.name, c.city
+"""
+
 def create_sample_sqlite_db():
     """Create a sample SQLite database for testing purposes"""
     
@@ -28,29 +64,18 @@ def create_sample_sqlite_db():
     
     # Create database and tables
     conn = sqlite3.connect(db_path)
+    conn.executescript(SAMPLE_SCHEMA)
     
     # Create customers table
     customers_df = pd.DataFrame(customers_data)
-    customers_df.to_sql('customers', conn, if_exists='replace', index=False)
+    customers_df.to_sql('customers', conn, if_exists='append', index=False)
     
     # Create orders table
     orders_df = pd.DataFrame(orders_data)
-    orders_df.to_sql('orders', conn, if_exists='replace', index=False)
+    orders_df.to_sql('orders', conn, if_exists='append', index=False)
     
     # Create a sample analytics view
-    conn.execute("""
-        CREATE VIEW IF NOT EXISTS customer_summary AS
-        SELECT 
-            c.customer_id,
-            c.name,
-            c.city,
-            COUNT(o.order_id) as total_orders,
-            SUM(o.amount) as total_spent,
-            AVG(o.amount) as avg_order_value
-        FROM customers c
-        LEFT JOIN orders o ON c.customer_id = o.customer_id
-        GROUP BY c.customer_id, c.name, c.city
-    """)
+    conn.execute(CUSTOMER_SUMMARY_VIEW)
     
     conn.commit()
     conn.close()
@@ -0,0 +1,138 @@
+"""
+Relationship-aware joins over foreign keys discovered by DatabaseConnector.
+
+Selected tables are connected through a spanning tree of the foreign-key
+graph, rooted at the most "fact-like" table (most outgoing minus incoming
+foreign keys) so joins follow many-to-one edges and keep its row count.
+The join runs server-side as one SQL query. Only SQL databases report
+foreign keys, so other databases never get a join plan.
+"""
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from db.db_connector import DatabaseConnector
+from utils.metrics import span
+
+
+class JoinEdge:
+    """Join `right_table` onto the tree via left_table.left_key = right_table.right_key."""
+
+    def __init__(self, left_table: str, left_key: str, right_table: str, right_key: str):
+        self.left_table = left_table
+        self.left_key = left_key
+        self.right_table = right_table
+        self.right_key = right_key
+
+    def __repr__(self):
+        return f"{self.left_table}.{self.left_key} = {self.right_table}.{self.right_key}"
+
+
+class JoinGraph:
+    def __init__(self, relationships: List[Dict[str, str]]):
+        # table -> [(neighbour, own key, neighbour key, is_outgoing_fk)]
+        self.adjacency: Dict[str, List[Tuple[str, str, str, bool]]] = {}
+        for rel in relationships:
+            table, related = rel["table"], rel["related_table"]
+            key, related_key = rel["key"], rel.get("related_key") or rel["key"]
+            self.adjacency.setdefault(table, []).append((related, key, related_key, True))
+            self.adjacency.setdefault(related, []).append((table, related_key, key, False))
+
+    def root(self, tables: List[str]) -> str:
+        """The selected table with the most outgoing minus incoming foreign keys."""
+        def score(table):
+            return sum(1 if out else -1 for n, _, _, out in self.adjacency.get(table, []) if n in tables)
+        return max(tables, key=lambda t: (score(t), -tables.index(t)))
+
+    def join_plan(self, tables: List[str]) -> Optional[Tuple[str, List[JoinEdge]]]:
+        """Root table and ordered join edges connecting all `tables`, or None if not connected.
+
+        Breadth-first over selected tables only, taking many-to-one edges
+        (child -> parent) before one-to-many ones to avoid fanning out rows.
+        """
+        if not tables:
+            return None
+        root = self.root(tables)
+        selected = set(tables)
+        visited = {root}
+        edges: List[JoinEdge] = []
+        queue = deque([root])
+        while queue:
+            table = queue.popleft()
+            neighbours = sorted(self.adjacency.get(table, []), key=lambda n: not n[3])
+            for neighbour, key, neighbour_key, _ in neighbours:
+                if neighbour in selected and neighbour not in visited:
+                    visited.add(neighbour)
+                    edges.append(JoinEdge(table, key, neighbour, neighbour_key))
+                    queue.append(neighbour)
+        if visited != selected:
+            return None
+        return root, edges
+
+
+def _quote(identifier: str, db_type: str) -> str:
+    if db_type == 'mysql':
+        return "`" + identifier.replace("`", "``") + "`"
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _output_names(root: str, edges: List[JoinEdge], columns: Dict[str, List[str]]) -> List[Tuple[str, str, str]]:
+    """(table, column, output name) for the joined result.
+
+    Join keys on the right side duplicate the left side and are dropped; other
+    clashing names are prefixed with their table name, then numbered if that
+    name is taken too.
+    """
+    dropped = {(e.right_table, e.right_key) for e in edges}
+    seen = set()
+    output = []
+    for table in [root] + [e.right_table for e in edges]:
+        for column in columns[table]:
+            if (table, column) in dropped:
+                continue
+            name = column if column not in seen else f"{table}_{column}"
+            base, n = name, 2
+            while name in seen:
+                name, n = f"{base}_{n}", n + 1
+            seen.add(name)
+            output.append((table, column, name))
+    return output
+
+
+def build_join_query(root: str, edges: List[JoinEdge], columns: Dict[str, List[str]],
+                     db_type: str, limit: Optional[int] = None) -> str:
+    q = lambda identifier: _quote(identifier, db_type)  # noqa: E731
+    select = ",\n       ".join(
+        f"{q(table)}.{q(column)} AS {q(name)}" for table, column, name in _output_names(root, edges, columns)
+    )
+    sql = f"SELECT {select}\nFROM {q(root)}"
+    for edge in edges:
+        sql += (f"\nLEFT JOIN {q(edge.right_table)} ON "
+                f"{q(edge.left_table)}.{q(edge.left_key)} = {q(edge.right_table)}.{q(edge.right_key)}")
+    if limit:
+        sql += f"\nLIMIT {int(limit)}"
+    return sql
+
+
+def build_related_dataset(connector: DatabaseConnector, database: str, tables: List[str],
+                          limit: int = 1000) -> Optional[Tuple[pd.DataFrame, List[JoinEdge]]]:
+    """Join the selected tables along their foreign keys.
+
+    Returns None when the tables are not connected by foreign keys, so the
+    caller can fall back to analysing them separately.
+    """
+    if len(tables) < 2 or connector.db_type not in ('mysql', 'postgresql', 'sqlite'):
+        return None
+    relationships = connector.get_table_relationships(database, tables)
+    plan = JoinGraph(relationships).join_plan(tables)
+    if plan is None:
+        return None
+    root, edges = plan
+
+    with span("join", db_type=connector.db_type, tables=len(tables)):
+        columns = {table: list(connector.fetch_data(f"SELECT * FROM {_quote(table, connector.db_type)} LIMIT 0",
+                                                    database).columns)
+                   for table in tables}
+        query = build_join_query(root, edges, columns, connector.db_type, limit)
+        return connector.fetch_data(query, database), edges
@@ -0,0 +1,164 @@
+"""
+Per-session SQLite copies of uploaded sheets.
+
+Uploaded CSV/XLSX sheets are bulk-loaded (one `executemany` per table inside
+a single transaction) into a SQLite file per session, then indexed on
+key-like and low-cardinality columns. The file is opened through
+`DatabaseConnector("sqlite", path, ...)`, so the custom query box works on
+uploads exactly as on any other database.
+"""
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+from utils.metrics import span
+
+
+UPLOAD_DB_DIR = os.environ.get("UPLOAD_DB_DIR", os.path.join(tempfile.gettempdir(), "aivengers_uploads"))
+UPLOAD_DB_MAX_AGE_HOURS = float(os.environ.get("UPLOAD_DB_MAX_AGE_HOURS", "24"))
+INDEX_MAX_DISTINCT_RATIO = 0.05  # index columns with few distinct values relative to rows
+MAX_INDEXES_PER_TABLE = 16
+
+_SQL_SCALARS = (str, int, float, bytes)
+_KEY_LIKE = re.compile(r"(?i:^id$|_id$|_key$|_code$)|[a-z]Id$")
+
+# db path -> {table: fingerprint} of what has been exported in this process
+_exported: Dict[str, Dict[str, str]] = {}
+_exported_lock = threading.Lock()
+
+
+def session_db_path(username: str, session_id: str) -> str:
+    """SQLite file for one user session; files older than UPLOAD_DB_MAX_AGE_HOURS are removed."""
+    user_dir = os.path.join(UPLOAD_DB_DIR, re.sub(r"[^\w.-]", "_", username))
+    os.makedirs(user_dir, exist_ok=True)
+    cutoff = time.time() - UPLOAD_DB_MAX_AGE_HOURS * 3600
+    for entry in os.scandir(user_dir):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+    return os.path.join(user_dir, f"{session_id}.db")
+
+
+def table_name(file_name: str, sheet: str) -> str:
+    """SQL-friendly table name: the file name for CSVs, the sheet name for workbooks."""
+    base = os.path.splitext(os.path.basename(file_name))[0] if file_name.endswith(".csv") else sheet
+    name = re.sub(r"\W+", "_", base).strip("_").lower() or "sheet"
+    return f"t_{name}" if name[0].isdigit() else name
+
+
+def _quote(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def column_names(df: pd.DataFrame) -> List[str]:
+    """Non-blank column names of `df`, numbered so they are unique ignoring case."""
+    names, seen = [], set()
+    for column in df.columns:
+        name = str(column).strip() or "column"
+        candidate, n = name, 2
+        while candidate.lower() in seen:
+            candidate, n = f"{name}_{n}", n + 1
+        seen.add(candidate.lower())
+        names.append(candidate)
+    return names
+
+
+def _sql_type(col: pd.Series) -> str:
+    dtype = col.cat.categories.dtype if isinstance(col.dtype, pd.CategoricalDtype) else col.dtype
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def _sql_values(col: pd.Series) -> list:
+    """Column as a list of Python values sqlite3 accepts, with None for missing."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        # Convert each category once, then expand by code
+        categories = _sql_values(pd.Series(col.cat.categories))
+        return [categories[code] if code >= 0 else None for code in col.cat.codes.tolist()]
+    if pd.api.types.is_datetime64_any_dtype(col.dtype):
+        col = col.dt.strftime("%Y-%m-%d %H:%M:%S")
+    values = col.astype(object).where(col.notna(), None).tolist()
+    if col.dtype == object:
+        # Mixed Excel columns can hold times, timedeltas, etc.
+        values = [v if v is None or isinstance(v, _SQL_SCALARS) else str(v) for v in values]
+    return values
+
+
+def index_candidates(df: pd.DataFrame, names: List[str]) -> List[str]:
+    """Key-like columns and low-cardinality columns, in that order."""
+    if df.empty:
+        return []
+    keys, low_cardinality = [], []
+    for position, name in enumerate(names):
+        col = df.iloc[:, position]
+        if _KEY_LIKE.search(name):
+            keys.append(name)
+            continue
+        try:
+            distinct = col.nunique()
+        except TypeError:  # unhashable cells
+            continue
+        if 1 < distinct <= max(1, int(len(df) * INDEX_MAX_DISTINCT_RATIO)):
+            low_cardinality.append(name)
+    return (keys + low_cardinality)[:MAX_INDEXES_PER_TABLE]
+
+
+def _load_table(conn: sqlite3.Connection, table: str, df: pd.DataFrame) -> List[str]:
+    names = column_names(df)
+    columns_sql = ", ".join(f"{_quote(name)} {_sql_type(df.iloc[:, i])}" for i, name in enumerate(names))
+    conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+    conn.execute(f"CREATE TABLE {_quote(table)} ({columns_sql})")
+    placeholders = ", ".join("?" for _ in names)
+    rows = zip(*(_sql_values(df.iloc[:, i]) for i in range(len(names))))
+    conn.executemany(f"INSERT INTO {_quote(table)} VALUES ({placeholders})", rows)
+
+    # Indexes are built after the load: one sort per index instead of per-row updates
+    indexed = index_candidates(df, names)
+    for name in indexed:
+        index = _quote(f"idx_{table}_{name}")
+        conn.execute(f"CREATE INDEX {index} ON {_quote(table)} ({_quote(name)})")
+    return indexed
+
+
+def export_tables(db_path: str, tables: Dict[str, Tuple[str, pd.DataFrame]]) -> Dict[str, List[str]]:
+    """Write `{table: (fingerprint, df)}` into the SQLite file at `db_path`.
+
+    Tables already exported with the same fingerprint are skipped, so calling
+    this on every Streamlit rerun is cheap. Returns {table: indexed columns}
+    for the tables that were (re)written.
+    """
+    with _exported_lock:
+        done = dict(_exported.get(db_path, {})) if os.path.exists(db_path) else {}
+    pending = {table: item for table, item in tables.items() if done.get(table) != item[0]}
+    if not pending:
+        return {}
+
+    written = {}
+    with span("upload_db_export", tables=len(pending)):
+        conn = sqlite3.connect(db_path)
+        try:
+            # The file is a rebuildable cache: skip the journal and fsyncs during the load
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            with conn:
+                for table, (fingerprint, df) in pending.items():
+                    written[table] = _load_table(conn, table, df)
+                    done[table] = fingerprint
+            conn.execute("ANALYZE")
+        finally:
+            conn.close()
+
+    with _exported_lock:
+        _exported[db_path] = done
+    return written
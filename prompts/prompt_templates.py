@@ -0,0 +1,39 @@
+from typing import Dict, Optional
+from data.profile import DatasetProfile
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:.4g}"
+
+
+def build_profile_context(name: str, profile: DatasetProfile, max_columns: int = 30) -> str:
+    """Compact description of a dataset's profile for the LLM prompt."""
+    lines = [f"Dataset '{name}': {profile.row_count} rows, {len(profile.columns)} columns."]
+    for column, stats in list(profile.columns.items())[:max_columns]:
+        line = f"- {column} ({stats.kind}, ~{stats.distinct} distinct, {stats.nulls} missing"
+        if stats.kind == "numeric":
+            std = stats.variance ** 0.5 if stats.variance is not None else None
+            line += f", mean {_fmt(stats.mean)}, std {_fmt(std)}, min {_fmt(stats.min)}, max {_fmt(stats.max)}"
+        lines.append(line + ")")
+    if len(profile.columns) > max_columns:
+        lines.append(f"- ... {len(profile.columns) - max_columns} more columns")
+
+    corr = profile.correlation.correlation()
+    pairs = []
+    for i, left in enumerate(corr.columns):
+        for right in corr.columns[i + 1:]:
+            value = corr.loc[left, right]
+            if value == value and abs(value) >= 0.5:  # skip NaN and weak pairs
+                pairs.append((abs(value), left, right, value))
+    if pairs:
+        strongest = sorted(pairs, reverse=True)[:5]
+        lines.append("Strongest correlations: " + ", ".join(f"{l}~{r} ({v:.2f})" for _, l, r, v in strongest))
+    return "\n".join(lines)
+
+
+def build_dataset_context(profiles: Dict[str, DatasetProfile]) -> str:
+    """Context block for all loaded datasets, prepended to the user's question."""
+    if not profiles:
+        return ""
+    sections = [build_profile_context(name, profile) for name, profile in profiles.items()]
+    return "Dataset profile (precomputed):\n" + "\n".join(sections) + "\n\n"
@@ -1,5 +1,6 @@
 import json
 import os
+from utils.metrics import span
 
 def get_user_dir(username):
     dir_path = os.path.join("user_data", username)
@@ -17,8 +18,9 @@ def save_query(username, query, response,response_time=None):
         data = []
 
     data.append({"query": query, "response": response,"response_time": response_time})
-    with open(file_path, "w") as f:
-        json.dump(data, f)
+    with span("storage_write"):
+        with open(file_path, "w") as f:
+            json.dump(data, f)
 
 def get_query_history(username):
     file_path = os.path.join("user_data", username, "query_log.json")
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    """Point every LLM route at a fresh stub server; yields the server."""
+    from chatbot import llm_gateway
+    from chatbot.stub_llm_server import start_stub_server, stub_base_url
+
+    server = start_stub_server()
+    for route, config in llm_gateway.MODEL_ROUTES.items():
+        monkeypatch.setitem(llm_gateway.MODEL_ROUTES, route, dict(config, base_url=stub_base_url(server)))
+    monkeypatch.setattr(llm_gateway, "_clients", {})
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from data.frame_store import FrameStore, analysis_frame
+
+
+def _store():
+    return FrameStore(max_bytes=1 << 30)
+
+
+def test_compaction_keeps_numeric_results():
+    df = pd.DataFrame({"qty": np.full(1000, 60000), "price": np.full(1000, 50000),
+                       "amount": np.linspace(0, 2469, 1000)})
+    _, stored = _store().put(df)
+    assert (stored["qty"] * stored["price"]).iloc[0] == 3_000_000_000
+    assert stored["amount"].sum() == df["amount"].sum()
+
+
+def test_analysis_frame_has_no_categoricals():
+    df = pd.DataFrame({"city": ["Paris", "Rome"] * 50 + [None], "n": range(101)})
+    _, stored = _store().put(df)
+    assert isinstance(stored["city"].dtype, pd.CategoricalDtype)
+
+    plain = analysis_frame(stored)
+    assert plain["city"].isna().sum() == 1
+    plain.loc[plain["n"] > 5, "city"] = "Other"
+    assert set(plain[plain["n"] < 3]["city"].value_counts().index) == {"Paris", "Rome"}
+
+
+def test_unhashable_frames_get_distinct_keys():
+    store = _store()
+    first, _ = store.put(pd.DataFrame({"doc": [{"a": 1}]}))
+    second, _ = store.put(pd.DataFrame({"doc": [{"a": 1}]}))
+    assert first != second
@@ -0,0 +1,67 @@
+import sqlite3
+
+from db.db_connector import DatabaseConnector
+from db.join_graph import JoinEdge, JoinGraph, _output_names, build_related_dataset
+
+# orders -> customers, orders -> products, customers -> regions
+RELATIONSHIPS = [
+    {"table": "orders", "key": "customer_id", "related_table": "customers", "related_key": "id"},
+    {"table": "orders", "key": "product_id", "related_table": "products", "related_key": "id"},
+    {"table": "customers", "key": "region_id", "related_table": "regions", "related_key": "id"},
+]
+
+
+def test_root_is_the_fact_table():
+    graph = JoinGraph(RELATIONSHIPS)
+    assert graph.root(["customers", "orders", "products"]) == "orders"
+    assert graph.root(["regions", "customers"]) == "customers"
+
+
+def test_join_plan_follows_foreign_keys_from_the_root():
+    root, edges = JoinGraph(RELATIONSHIPS).join_plan(["customers", "regions", "orders"])
+    assert root == "orders"
+    assert [repr(edge) for edge in edges] == [
+        "orders.customer_id = customers.id",
+        "customers.region_id = regions.id",
+    ]
+
+
+def test_join_plan_is_none_for_unconnected_tables():
+    graph = JoinGraph(RELATIONSHIPS)
+    # products and regions are only connected through tables that are not selected
+    assert graph.join_plan(["products", "regions"]) is None
+    assert graph.join_plan(["orders", "suppliers"]) is None
+    assert graph.join_plan([]) is None
+
+
+def test_output_names_drop_right_keys_and_prefix_clashes():
+    edges = [JoinEdge("orders", "customer_id", "customers", "id")]
+    columns = {
+        "orders": ["id", "customer_id", "name", "customers_name"],
+        "customers": ["id", "name"],
+    }
+    assert _output_names("orders", edges, columns) == [
+        ("orders", "id", "id"),
+        ("orders", "customer_id", "customer_id"),
+        ("orders", "name", "name"),
+        ("orders", "customers_name", "customers_name"),
+        ("customers", "name", "customers_name_2"),
+    ]
+
+
+def test_build_related_dataset_joins_sqlite_tables(tmp_path):
+    path = str(tmp_path / "shop.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, customer_id INTEGER REFERENCES customers(id), amount REAL);
+        INSERT INTO customers VALUES (1, 'Ada'), (2, 'Grace');
+        INSERT INTO orders VALUES (10, 1, 5.0), (11, 2, 7.5), (12, 1, 1.0);
+    """)
+    conn.close()
+    connector = DatabaseConnector("sqlite", path, 0, "", "", "")
+
+    joined, edges = build_related_dataset(connector, "main", ["customers", "orders"])
+    assert [repr(edge) for edge in edges] == ["orders.customer_id = customers.id"]
+    assert list(joined.columns) == ["id", "customer_id", "amount", "name"]
+    assert joined.sort_values("id")["name"].tolist() == ["Ada", "Grace", "Ada"]
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from chatbot import llm_gateway
+from chatbot.llm_gateway import SlotPool
+from chatbot.stub_llm_server import StubOllamaHandler
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def test_background_acquire_refused_while_interactive_waits():
+    pool = SlotPool(1)
+    assert pool.acquire(1)
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire(5)))
+    waiter.start()
+    _wait_until(lambda: pool._interactive_waiting == 1)
+
+    assert not pool.acquire(0.1, background=True)
+    pool.release()
+    waiter.join(5)
+    assert got == [True]
+    pool.release()
+    assert pool.acquire(0.1, background=True)
+
+
+def test_background_callers_are_capped():
+    pool = SlotPool(4, background_size=1)
+    assert pool.acquire(0.1, background=True)
+    assert not pool.acquire(0.1, background=True)
+    assert pool.acquire(0.1)  # interactive callers still get the free slots
+    pool.release(background=True)
+    assert pool.acquire(0.1, background=True)
+
+
+def test_batch_returns_results_in_order(stub_llm):
+    prompts = [f"Rephrase the following question:\n\nquestion {i}" for i in range(10)]
+    assert llm_gateway.batch("rephrase", prompts, user="alice") == [f"question {i}" for i in range(10)]
+
+
+def test_batch_in_flight_bounded_by_global_slots(stub_llm, monkeypatch):
+    in_flight, peak, lock = [0], [0], threading.Lock()
+    do_post = StubOllamaHandler.do_POST
+
+    def counting_post(self):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        try:
+            time.sleep(0.05)
+            do_post(self)
+        finally:
+            with lock:
+                in_flight[0] -= 1
+
+    monkeypatch.setattr(StubOllamaHandler, "do_POST", counting_post)
+    monkeypatch.setattr(llm_gateway, "_global_slots", SlotPool(2))
+    prompts = [f"Rephrase the following question:\n\nq{i}" for i in range(8)]
+    threads = [threading.Thread(target=llm_gateway.batch, args=("rephrase", prompts), kwargs={"user": f"u{i}"})
+               for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert peak[0] == 2
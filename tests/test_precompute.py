@@ -0,0 +1,39 @@
+import gc
+import weakref
+
+import pandas as pd
+import pytest
+
+from chatbot.precompute import Precomputer
+
+
+def _frame():
+    return pd.DataFrame({"amount": [1.0, 2.0, 3.0], "city": ["Paris", "Rome", "Paris"]})
+
+
+def test_jobs_run_against_the_submitted_frame():
+    precomputer = Precomputer(workers=0)
+    df = _frame()
+    precomputer.submit("key", "Sheet1", df)
+    assert precomputer.result("key", "profile").row_count == 3
+
+
+def test_unrequested_jobs_do_not_keep_frames_alive():
+    precomputer = Precomputer(workers=0, summaries=False)
+    df = _frame()
+    ref = weakref.ref(df)
+    precomputer.submit("key", "Sheet1", df)
+    del df
+    gc.collect()
+    assert ref() is None
+    with pytest.raises(LookupError):
+        precomputer.result("key", "summary")
+
+
+def test_evicted_datasets_release_their_frames():
+    precomputer = Precomputer(workers=0, max_datasets=1)
+    df = _frame()
+    precomputer.submit("old", "Sheet1", df)
+    precomputer.submit("new", "Sheet1", _frame())
+    assert precomputer.status("old") == {}
+    assert "old" not in precomputer._frames
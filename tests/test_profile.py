@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.file_handler import suggest_questions
+from data.profile import DatasetProfile, DistinctSketch, extend_profile, profile_dataset
+
+
+def _frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "amount": rng.normal(100, 15, n),
+        "qty": rng.integers(1, 10, n),
+        "city": rng.choice(["Paris", "Rome", "Oslo", None], n),
+        "day": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D"),
+    })
+
+
+def test_duplicate_column_labels_are_profiled():
+    df = pd.DataFrame([[1, "a", 2.0], [2, "b", 3.5], [3, "a", 1.0]], columns=["id", "name", "id"])
+    profile = DatasetProfile.from_frame(df)
+    assert list(profile.columns) == ["id", "name", "id_2"]
+    assert profile.columns["id_2"].mean == pytest.approx(6.5 / 3)
+    assert profile.same_schema(df)
+    assert suggest_questions(df, profile=profile)
+
+
+def _assert_same_profile(actual, expected):
+    assert actual.row_count == expected.row_count
+    assert actual.digest == expected.digest
+    assert list(actual.columns) == list(expected.columns)
+    for name, stats in expected.columns.items():
+        other = actual.columns[name]
+        assert (other.kind, other.count, other.nulls, other.distinct) == \
+            (stats.kind, stats.count, stats.nulls, stats.distinct), name
+        if stats.kind != "categorical":
+            assert other.mean == pytest.approx(stats.mean)
+            assert other.variance == pytest.approx(stats.variance)
+            assert (other.min, other.max) == (stats.min, stats.max)
+    np.testing.assert_allclose(actual.correlation.correlation(), expected.correlation.correlation())
+
+
+def test_merged_chunks_equal_whole_frame():
+    df = _frame(3000)
+    merged = DatasetProfile.from_frame(df.iloc[:1000])
+    for chunk in (df.iloc[1000:2500], df.iloc[2500:]):
+        merged.merge(DatasetProfile.from_frame(chunk))
+    _assert_same_profile(merged, DatasetProfile.from_frame(df))
+
+
+def test_incremental_update_equals_whole_frame():
+    df = _frame(2000, seed=1)
+    profile = DatasetProfile.from_frame(df.iloc[:700])
+    profile.update(df.iloc[700:])
+    _assert_same_profile(profile, DatasetProfile.from_frame(df))
+
+
+def test_profile_round_trips_through_dict():
+    profile = DatasetProfile.from_frame(_frame(500))
+    _assert_same_profile(DatasetProfile.from_dict(profile.to_dict()), profile)
+
+
+def test_distinct_sketch_is_exact_when_small_and_close_when_large():
+    values = pd.Series(np.arange(200_000))
+    small = DistinctSketch()
+    small.update(pd.util.hash_pandas_object(values[:100], index=False).to_numpy())
+    assert small.estimate() == 100
+
+    left, right = DistinctSketch(), DistinctSketch()
+    left.update(pd.util.hash_pandas_object(values[:120_000], index=False).to_numpy())
+    right.update(pd.util.hash_pandas_object(values[80_000:], index=False).to_numpy())
+    left.merge(right)
+    assert left.estimate() == pytest.approx(200_000, rel=0.2)
+
+
+def test_extend_profile_accepts_appended_rows_only():
+    df = _frame(1000, seed=2)
+    stored = DatasetProfile.from_frame(df.iloc[:600])
+    assert extend_profile(stored, df)
+    _assert_same_profile(stored, DatasetProfile.from_frame(df))
+
+    edited = df.copy()
+    edited.loc[10, "amount"] += 1
+    stale = DatasetProfile.from_frame(df.iloc[:600])
+    assert not extend_profile(stale, edited)
+    assert stale.row_count == 600
+    assert not extend_profile(stale, df.iloc[:500])
+    assert not extend_profile(stale, df.drop(columns=["qty"]))
+    assert not extend_profile(None, df)
+
+
+def test_profile_dataset_only_profiles_new_rows(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # profiles are stored under ./user_data
+    df = _frame(1000, seed=3)
+    profile_dataset(df.iloc[:800], "alice", "orders.csv")
+
+    def no_rebuild(cls, frame):
+        raise AssertionError("profile was rebuilt instead of extended")
+
+    monkeypatch.setattr(DatasetProfile, "from_frame", classmethod(no_rebuild))
+    profile = profile_dataset(df, "alice", "orders.csv")
+    assert profile.row_count == 1000
+    monkeypatch.undo()
+    _assert_same_profile(profile, DatasetProfile.from_frame(df))
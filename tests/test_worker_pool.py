@@ -0,0 +1,46 @@
+from contextlib import contextmanager
+
+import pandas as pd
+import pytest
+
+from chatbot import worker_pool
+from chatbot.llm_gateway import SlotPool
+from chatbot.worker_pool import ARROW_IPC_AVAILABLE, AnalysisTimeoutError, _decode_frame, _encode_frame
+
+
+def _round_trip(df):
+    fmt, shm, size = _encode_frame(df)
+    try:
+        return fmt, _decode_frame(fmt, shm.name, size)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_plain_frames_use_arrow():
+    fmt, decoded = _round_trip(pd.DataFrame({"a": [1, 2], "b": ["x", "y"]}))
+    assert fmt == ("arrow" if ARROW_IPC_AVAILABLE else "pickle")
+    assert decoded["b"].tolist() == ["x", "y"]
+
+
+def test_duplicate_column_names_fall_back_to_pickle():
+    df = pd.DataFrame([[1, "a", 2]], columns=["id", "name", "id"])
+    fmt, decoded = _round_trip(df)
+    assert fmt == "pickle"
+    pd.testing.assert_frame_equal(decoded, df)
+
+
+def test_hold_is_not_taken_while_waiting_for_a_worker(monkeypatch):
+    slots = SlotPool(1)
+    assert slots.acquire(0)
+    monkeypatch.setattr(worker_pool, "_worker_slots", slots)
+    entered = []
+
+    @contextmanager
+    def hold():
+        entered.append(True)
+        yield
+
+    with pytest.raises(AnalysisTimeoutError):
+        worker_pool.run_task("chatbot.worker_pool:agent_task", {}, timeout=0.1, hold=hold())
+    assert not entered
@@ -0,0 +1,271 @@
+"""
+Lightweight tracing spans and Prometheus-style metrics.
+
+Every span is recorded in the `aivengers_span_seconds` histogram labelled by
+span name, and optionally written as a JSON line to METRICS_LOG_FILE so a
+slow question can be broken down step by step. Metrics are exposed in the
+Prometheus text format by `start_metrics_server` (GET /metrics).
+"""
+import functools
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))  # 0 disables the endpoint
+METRICS_LOG_FILE = os.environ.get("METRICS_LOG_FILE")
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+MEMORY_BUCKETS_MB = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+# Histograms that are not durations in seconds
+METRIC_BUCKETS = {"aivengers_worker_peak_rss_mb": MEMORY_BUCKETS_MB}
+RECENT_SAMPLES = 1000
+
+logger = logging.getLogger("aivengers.metrics")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+_counters: Dict[str, Dict[LabelKey, float]] = {}
+_histograms: Dict[str, Dict[LabelKey, "Histogram"]] = {}
+_help: Dict[str, str] = {}
+_trace = threading.local()
+_captured: Optional[List[Tuple[str, str, LabelKey, float]]] = None
+_server: Optional["ThreadingHTTPServer"] = None
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.recent:
+            return None
+        values = sorted(self.recent)
+        index = min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))
+        return values[index]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def inc(name: str, value: float = 1, help: str = "", **labels):
+    key = _label_key(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+        if help:
+            _help.setdefault(name, help)
+        if _captured is not None:
+            _captured.append(("counter", name, key, value))
+
+
+def observe(name: str, value: float, help: str = "", **labels):
+    key = _label_key(labels)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        hist = series.get(key)
+        if hist is None:
+            hist = series[key] = Histogram(METRIC_BUCKETS.get(name, DEFAULT_BUCKETS))
+        hist.observe(value)
+        if help:
+            _help.setdefault(name, help)
+        if _captured is not None:
+            _captured.append(("histogram", name, key, value))
+
+
+def percentile(name: str, q: float, **labels) -> Optional[float]:
+    with _lock:
+        hist = _histograms.get(name, {}).get(_label_key(labels))
+        return hist.percentile(q) if hist else None
+
+
+def _write_log(record: Dict[str, Any]):
+    logger.debug("span %s", record)
+    if METRICS_LOG_FILE:
+        with _lock, open(METRICS_LOG_FILE, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+@contextmanager
+def span(name: str, **labels):
+    """Time a step of the request path.
+
+    Nested spans share a trace id so a slow request can be reassembled from
+    the log sink.
+    """
+    stack: List[str] = getattr(_trace, "stack", None) or []
+    trace_id = getattr(_trace, "trace_id", None) if stack else uuid.uuid4().hex[:16]
+    _trace.trace_id = trace_id
+    parent = stack[-1] if stack else None
+    _trace.stack = stack + [name]
+
+    error = None
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _trace.stack = stack
+        _record(name, duration, error, trace_id, parent, labels)
+
+
+def _record(name: str, duration: float, error: Optional[str], trace_id: Optional[str], parent: Optional[str],
+            labels: Dict[str, Any]):
+    if error:
+        inc("aivengers_span_errors_total", help="Spans that raised an exception", span=name, **labels)
+    observe("aivengers_span_seconds", duration, help="Duration of request path steps", span=name, **labels)
+    _write_log({
+        "trace_id": trace_id,
+        "span": name,
+        "parent": parent,
+        "duration_s": round(duration, 6),
+        "labels": {k: str(v) for k, v in labels.items()},
+        "error": error,
+        "timestamp": time.time(),
+    })
+
+
+def record_span(name: str, duration: float, error: Optional[str] = None, **labels):
+    """Record a step timed elsewhere (e.g. by a callback) as a child of the current span."""
+    stack: List[str] = getattr(_trace, "stack", None) or []
+    trace_id = getattr(_trace, "trace_id", None) if stack else uuid.uuid4().hex[:16]
+    _record(name, duration, error, trace_id, stack[-1] if stack else None, labels)
+
+
+def timed(name: str, **labels):
+    """Decorator form of `span`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = ('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in items)
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for name, series in sorted(_counters.items()):
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        for name, series in sorted(_histograms.items()):
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, hist in series.items():
+                for bound, count in zip(hist.buckets, hist.bucket_counts):
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', str(bound)))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {hist.count}")
+                lines.append(f"{name}_sum{_format_labels(key)} {hist.sum}")
+                lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+    return "\n".join(lines) + "\n"
+
+
+def span_summary() -> List[Dict[str, Any]]:
+    """Count, mean, p50 and p95 per span, slowest first."""
+    rows = []
+    with _lock:
+        series = dict(_histograms.get("aivengers_span_seconds", {}))
+        for key, hist in series.items():
+            rows.append({
+                **dict(key),
+                "count": hist.count,
+                "mean_s": round(hist.sum / hist.count, 4) if hist.count else None,
+                "p50_s": hist.percentile(50),
+                "p95_s": hist.percentile(95),
+            })
+    return sorted(rows, key=lambda r: r["p95_s"] or 0, reverse=True)
+
+
+def start_capture():
+    """Also keep a copy of every metric update from now on, for `captured()`.
+
+    Used by worker processes, whose metrics would otherwise be lost on exit.
+    """
+    global _captured
+    with _lock:
+        _captured = []
+
+
+def captured() -> List[Tuple[str, str, LabelKey, float]]:
+    with _lock:
+        return list(_captured or [])
+
+
+def merge_captured(updates: List[Tuple[str, str, LabelKey, float]]):
+    """Apply metric updates captured in another process."""
+    for kind, name, key, value in updates:
+        (inc if kind == "counter" else observe)(name, value, **dict(key))
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = "127.0.0.1") -> Optional["ThreadingHTTPServer"]:
+    """Serve /metrics in a daemon thread. Idempotent; port 0 disables it."""
+    global _server
+    if _server is None and port:
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        _server = ThreadingHTTPServer((host, port), MetricsHandler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server